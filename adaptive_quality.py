@@ -0,0 +1,69 @@
+import time
+import threading
+
+
+ADAPTIVE_LEVELS = ((1, 1.0), (2, 1.0), (2, 0.5), (4, 0.5))  # (live view shows every Nth camera frame, width scale)
+ADAPTIVE_INTERVAL = 2.0  # seconds, display latency and dropped frames are evaluated this often
+ADAPTIVE_MIN_FRAMES = 5  # Shown frames needed before quality is changed (slow cameras are evaluated less often)
+ADAPTIVE_LATENCY_HIGH = 0.2  # seconds, median grab to display latency which lowers live view quality
+ADAPTIVE_LATENCY_LOW = 0.08  # seconds, median latency below which live view quality is raised again
+ADAPTIVE_DROP_HIGH = 0.25  # Fraction of live view frames dropped before display which lowers quality
+ADAPTIVE_DROP_LOW = 0.05  # Fraction of dropped frames below which quality is raised again
+ADAPTIVE_RESTORE_INTERVALS = 3  # Quality is raised after this many quiet intervals in a row (no oscillation)
+
+
+class AdaptiveQuality:  # Live view frame rate and resolution from gui display latency and dropped frames
+
+    def __init__(self, levels=ADAPTIVE_LEVELS):
+        self.levels = levels
+        self.level = 0  # Index of levels, 0 is full quality
+        self._lock = threading.Lock()
+        self._latencies = []  # Grab to display latency of shown frames since last evaluation
+        self._dropped_frames = 0
+        self._quiet_intervals = 0
+        self._next_update_time = time.monotonic() + ADAPTIVE_INTERVAL
+
+    @property
+    def frame_interval(self):  # Camera frames per live view frame
+        return self.levels[self.level][0]
+
+    @property
+    def preview_scale(self):  # Fraction of preview width
+        return self.levels[self.level][1]
+
+    def add_frame(self, latency):  # Called (from gui thread) when live view frame has been shown
+        with self._lock:
+            self._latencies.append(latency)
+
+    def add_dropped(self, frames=1):  # Live view frames which were never shown (or gui was not ready for)
+        with self._lock:
+            self._dropped_frames += frames
+
+    def update(self):  # Called by camera decode thread, returns True when quality level has changed
+        now = time.monotonic()
+        if now < self._next_update_time:
+            return False
+        self._next_update_time = now + ADAPTIVE_INTERVAL
+        with self._lock:
+            if len(self._latencies) < ADAPTIVE_MIN_FRAMES:  # Keep collecting (e.g. no gui or slow camera)
+                return False
+            latencies = sorted(self._latencies)
+            dropped_frames = self._dropped_frames
+            self._latencies = []
+            self._dropped_frames = 0
+        latency = latencies[len(latencies) // 2]
+        drop_fraction = dropped_frames / (len(latencies) + dropped_frames)
+        if latency > ADAPTIVE_LATENCY_HIGH or drop_fraction > ADAPTIVE_DROP_HIGH:
+            self._quiet_intervals = 0
+            if self.level + 1 < len(self.levels):
+                self.level += 1
+                return True
+        elif latency < ADAPTIVE_LATENCY_LOW and drop_fraction < ADAPTIVE_DROP_LOW:
+            self._quiet_intervals += 1
+            if self.level > 0 and self._quiet_intervals >= ADAPTIVE_RESTORE_INTERVALS:
+                self._quiet_intervals = 0
+                self.level -= 1
+                return True
+        else:
+            self._quiet_intervals = 0
+        return False
@@ -0,0 +1,26 @@
+import os
+import binascii
+
+
+def write_file_atomic(file, data, sync=False):  # Readers never see a partial file (temporary file is renamed)
+    directory, name = os.path.split(os.path.abspath(file))
+    while True:
+        temporary_file = os.path.join(directory, ".%s.%s.tmp" % (name, binascii.hexlify(os.urandom(4)).decode()))
+        try:  # Permissions of a plain open() (process umask is applied by the operating system)
+            handle = os.open(temporary_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        with os.fdopen(handle, "wb") as temporary:
+            temporary.write(data)
+            if sync:
+                temporary.flush()
+                os.fsync(temporary.fileno())
+        os.replace(temporary_file, file)
+    except BaseException:
+        try:
+            os.remove(temporary_file)
+        except OSError:
+            pass
+        raise
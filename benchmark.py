@@ -0,0 +1,302 @@
+import os
+import sys
+import time
+import queue
+import random
+import argparse
+import threading
+import multiprocessing
+
+import numpy as np  # pip install numpy
+import cv2  # pip install OpenCV-python
+
+from live_camera import FrameBuffer
+from live_camera import LiveCamera
+from camera_process import ProcessCamera
+from pipeline_stats import PipelineStats
+from camera_messages import Command
+from camera_messages import CommandMessage
+
+try:
+    import psutil  # pip install psutil (optional, CPU time and memory of camera processes on all platforms)
+except ImportError:
+    psutil = None
+
+
+BENCHMARK_BACKENDS = {"thread": LiveCamera, "process": ProcessCamera}
+BENCHMARK_STATS_WINDOW = 100000  # Keep all frames of a benchmark run for latency percentiles
+
+
+class SyntheticCapture:  # cv2.VideoCapture stand-in: synthetic frames or replay of local video file at camera pace
+
+    def __init__(self, configuration):
+        self.fps = configuration.get("FPS", 30)
+        self.jitter = configuration.get("Jitter", 0)  # seconds, standard deviation of frame interval
+        self._video = None
+        video_file = configuration.get("Video File")
+        if video_file:
+            self._video = cv2.VideoCapture(video_file)
+            self.fps = configuration.get("FPS") or self._video.get(cv2.CAP_PROP_FPS) or 30
+        else:
+            width = configuration.get("Width", 1920)
+            height = configuration.get("Height", 1080)
+            self._frames = [self._synthetic_frame(width, height, index) for index in range(8)]
+        self._frame_index = 0
+        self._next_frame_time = time.monotonic()
+        self._opened = True
+
+    @staticmethod
+    def _synthetic_frame(width, height, index):
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+        frame = np.empty((height, width, 3), np.uint8)
+        frame[:, :, 0] = (x + index * 32) % 256
+        frame[:, :, 1] = y
+        frame[:, :, 2] = (x + y) / 2
+        return frame
+
+    def isOpened(self):
+        return self._opened
+
+    def grab(self):
+        if not self._opened:
+            return False
+        interval = max(0, random.gauss(1 / self.fps, self.jitter))
+        self._next_frame_time = max(self._next_frame_time + interval, time.monotonic() - 1)  # No catch up after stall
+        delay = self._next_frame_time - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._frame_index += 1
+        if self._video is not None:
+            status_ok = self._video.grab()
+            if not status_ok:  # Replay from start of video file
+                self._video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                status_ok = self._video.grab()
+            return status_ok
+        return True
+
+    def retrieve(self, image=None):
+        if self._video is not None:
+            return self._video.retrieve()
+        return True, self._frames[self._frame_index % len(self._frames)].copy()  # Decoded frames are new buffers
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        self._opened = False
+        if self._video is not None:
+            self._video.release()
+
+    def get(self, property_id):
+        return 0
+
+    def set(self, property_id, value):
+        return False
+
+
+def run_headless(configuration, streams, duration, backend, preview_width, adaptive=False):  # Frames are consumed without gui
+    cameras = []
+    stats = PipelineStats("all", BENCHMARK_STATS_WINDOW)
+    for stream in range(streams):
+        data_to_gui = queue.Queue()
+        data_from_gui = queue.Queue()
+        frames_to_gui = FrameBuffer(1)
+        camera = BENCHMARK_BACKENDS[backend](data_to_gui, data_from_gui, frames_to_gui)
+        data_arrived = threading.Event()
+        camera.notify = data_arrived.set
+        settings = {"NAME": "Synthetic %i" % stream, "CONFIG": configuration, "PREVIEW WIDTH": preview_width,
+                    "ADAPTIVE QUALITY": adaptive}
+        data_from_gui.put(CommandMessage(Command.SETTINGS, settings))
+        data_from_gui.put(CommandMessage(Command.START))
+        cameras.append((camera, data_to_gui, data_from_gui, frames_to_gui, data_arrived))
+    frame_counts = [0] * streams
+    stop = threading.Event()
+
+    def consumer(stream):  # Stands in for gui, displays newest frame when notified
+        camera, data_to_gui, data_from_gui, frames_to_gui, data_arrived = cameras[stream]
+        while not stop.is_set():
+            if not data_arrived.wait(timeout=0.1):
+                continue
+            data_arrived.clear()
+            while not data_to_gui.empty():
+                data_to_gui.get_nowait()
+            video_frame = frames_to_gui.get()
+            if video_frame is not None:
+                video_frame.display_time = time.monotonic()
+                stats.add_frame(video_frame)
+                frame_counts[stream] += 1
+
+    consumers = [threading.Thread(target=consumer, args=(stream,), daemon=True) for stream in range(streams)]
+    for thread in consumers:
+        thread.start()
+    result = _measure(duration, lambda: frame_counts, stats.reset)
+    result["latency_ms"] = stats.summary()["latency_ms"]
+    stop.set()
+    for camera, data_to_gui, data_from_gui, frames_to_gui, data_arrived in cameras:
+        camera.notify = None
+        data_from_gui.put(CommandMessage(Command.QUIT))
+    _wait_for_cameras([camera for camera, *_ in cameras])
+    result["dropped_frames"] = sum(frames_to_gui.dropped_frames for _, _, _, frames_to_gui, _ in cameras)
+    return result
+
+
+def run_gui(configuration, streams, duration, backend, preview_width, adaptive=False):  # Frames are shown in multi camera grid
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+    import camera_gui
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    cameras = {}
+    for stream in range(streams):
+        data_to_gui = queue.Queue()
+        data_from_gui = queue.Queue()
+        frames_to_gui = FrameBuffer(1)
+        camera = BENCHMARK_BACKENDS[backend](data_to_gui, data_from_gui, frames_to_gui)
+        settings = {"NAME": "Synthetic %i" % stream, "CONFIG": configuration, "PREVIEW WIDTH": preview_width,
+                    "ADAPTIVE QUALITY": adaptive}
+        data_from_gui.put(CommandMessage(Command.SETTINGS, settings))
+        data_from_gui.put(CommandMessage(Command.START))
+        cameras["Synthetic %i" % stream] = data_to_gui, data_from_gui, frames_to_gui, camera
+    window = camera_gui.GridWindow(app, cameras, preview_width)
+    for tile in window.tiles:
+        tile.pipeline_stats = PipelineStats(tile.pipeline_stats.name, BENCHMARK_STATS_WINDOW)
+    result = {}
+
+    def measure():
+        frame_counts = lambda: [tile.pipeline_stats.frames for tile in window.tiles]
+        reset_stats = lambda: [tile.pipeline_stats.reset() for tile in window.tiles]
+        result.update(_measure(duration, frame_counts, reset_stats, app.processEvents))
+        app.quit()
+
+    QTimer.singleShot(0, measure)
+    app.exec()
+    all_stats = PipelineStats("all", BENCHMARK_STATS_WINDOW)
+    for tile in window.tiles:
+        all_stats.merge(tile.pipeline_stats)
+    result["latency_ms"] = all_stats.summary()["latency_ms"]
+    for tile in window.tiles:
+        tile.camera.notify = None
+        tile.data_from_gui.put(CommandMessage(Command.QUIT))
+    _wait_for_cameras([tile.camera for tile in window.tiles])
+    result["dropped_frames"] = sum(tile.frames_to_gui.dropped_frames for tile in window.tiles)
+    window.hide()
+    return result
+
+
+def _measure(duration, frame_counts, reset_stats, process_events=None):
+    memory_samples = []  # Resident set size is sampled during the run (peak of this run, camera processes included)
+    warm_up_end_time = time.monotonic() + min(2, duration / 4)  # Connection and first frames are not measured
+    while time.monotonic() < warm_up_end_time:
+        _wait(0.05, process_events)
+        memory_samples.append(_memory())
+    reset_stats()
+    start_counts = list(frame_counts())
+    cpu_start_time = _cpu_time()
+    start_time = time.monotonic()
+    while time.monotonic() - start_time < duration:
+        _wait(0.05, process_events)
+        memory_samples.append(_memory())
+    elapsed_time = time.monotonic() - start_time
+    cpu_end_time = _cpu_time()
+    fps = [(end - start) / elapsed_time for start, end in zip(start_counts, frame_counts())]
+    result = {"fps_min": min(fps), "fps_mean": sum(fps) / len(fps), "cpu_percent_per_stream": None,
+              "peak_rss_mb": None if None in memory_samples else max(memory_samples)}
+    if cpu_start_time is not None and cpu_end_time is not None:
+        cpu_time = cpu_end_time - cpu_start_time
+        result["cpu_percent_per_stream"] = 100 * cpu_time / elapsed_time / len(fps)
+    return result
+
+
+def _wait(delay, process_events):
+    if process_events is None:
+        time.sleep(delay)
+        return
+    end_time = time.monotonic() + delay
+    while time.monotonic() < end_time:
+        process_events()
+        time.sleep(0.001)
+
+
+def _cpu_time():  # CPU time of this process and camera processes (None if not available)
+    if psutil is not None:
+        process = psutil.Process()
+        cpu_time = sum(process.cpu_times()[:2])
+        for child in process.children(recursive=True):
+            try:
+                cpu_time += sum(child.cpu_times()[:2])
+            except psutil.Error:
+                pass
+        return cpu_time
+    if multiprocessing.active_children():
+        return None  # Camera process CPU time is not available without psutil
+    return time.process_time()
+
+
+def _memory():  # Resident set size of this process and camera processes in MB (None if not available)
+    if psutil is not None:
+        process = psutil.Process()
+        rss = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                rss += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return rss / 1024 ** 2
+    rss = 0
+    for pid in ["self"] + [child.pid for child in multiprocessing.active_children()]:
+        try:  # Linux without psutil
+            with open("/proc/%s/statm" % pid) as statm:
+                rss += int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            return None
+    return rss / 1024 ** 2
+
+
+def _wait_for_cameras(cameras, timeout=5):
+    end_time = time.monotonic() + timeout
+    while time.monotonic() < end_time and not all(camera.thread_has_ended() for camera in cameras):
+        time.sleep(0.05)
+
+
+def _print_result(streams, result):
+    total = result["latency_ms"]["total"] or {"p50": float("nan"), "p99": float("nan")}
+    cpu = result["cpu_percent_per_stream"]
+    cpu_text = "n/a" if cpu is None else "%.1f" % cpu
+    memory = result["peak_rss_mb"]
+    memory_text = "n/a" if memory is None else "%.0f" % memory
+    print("%7i %8.1f %9.1f %8.1f %8.1f %9s %8i %12s" % (streams, result["fps_mean"], result["fps_min"], total["p50"],
+                                                        total["p99"], cpu_text, result["dropped_frames"], memory_text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live view pipeline benchmark with synthetic camera")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 16], help="number of cameras per run")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--jitter", type=float, default=0.002, help="seconds, standard deviation of frame interval")
+    parser.add_argument("--video-file", help="replay local video file instead of synthetic frames")
+    parser.add_argument("--preview-width", type=int, default=480, help="live view width (0 for full resolution)")
+    parser.add_argument("--backend", choices=sorted(BENCHMARK_BACKENDS), default="thread")
+    parser.add_argument("--gui", action="store_true", help="show frames in multi camera grid (Qt offscreen)")
+    parser.add_argument("--adaptive", action="store_true", help="lower live view quality when consumer falls behind")
+    args = parser.parse_args()
+
+    configuration = {"Capture Factory": SyntheticCapture, "Width": args.width, "Height": args.height,
+                     "FPS": args.fps, "Jitter": args.jitter, "Video File": args.video_file, "Reconnect": False}
+    run = run_gui if args.gui else run_headless
+    source = args.video_file or "%i x %i synthetic" % (args.width, args.height)
+    print("Source: %s, %.0f fps, backend: %s, gui: %s" % (source, args.fps, args.backend, args.gui))
+    print("streams fps_mean   fps_min  p50_ms   p99_ms  cpu%/str  dropped  peak_rss_mb")
+    for streams in args.streams:
+        preview_width = args.preview_width or (None if not args.gui else args.width)  # Grid tiles need a width
+        result = run(configuration, streams, args.duration, args.backend, preview_width, args.adaptive)
+        _print_result(streams, result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+import os
+import hmac
+import json
+import socket
+import struct
+import secrets
+from multiprocessing import shared_memory
+
+import numpy as np  # pip install numpy
+
+
+BROKER_ADDRESS = ("localhost", 6010)  # Local socket of stream broker (see stream_broker.py)
+BROKER_AUTHKEY_FILE = os.path.join(os.path.expanduser("~"), ".python-camera-broker-key")  # Created on first use
+BROKER_READ_TIMEOUT = 5  # seconds, broker reports an error when no frame arrives from camera within this time
+BROKER_FRAME_SLOTS = 4  # Shared memory frame slots per camera, subscribers copy a frame before its slot is reused
+BROKER_MESSAGE_SIZE = 1 << 16  # bytes, longest JSON message of broker protocol
+_MESSAGE_HEADER = struct.Struct("!I")  # Length of JSON message which follows
+
+
+class BrokerCapture:  # cv2.VideoCapture stand-in, camera frames are received from stream broker
+
+    def __init__(self, configuration):  # Camera configuration with "Broker": True or (host, port)
+        configuration = dict(configuration)
+        address = configuration.pop("Broker")
+        address = BROKER_ADDRESS if address is True else tuple(address)
+        authkey = configuration.pop("Broker Authkey", None)
+        configuration.pop("Reconnect", None)  # Broker always reconnects, viewers share one camera connection
+        self._connection = None
+        self._shared_ring = None
+        self._ring_arrays = None
+        self._frame = None  # FRAME reply (ring name, shape, slot, frame index) of last grabbed frame
+        try:
+            if authkey is None:
+                authkey = broker_authkey()
+            self._connection = socket.create_connection(address, timeout=BROKER_READ_TIMEOUT * 2)
+            broker_challenge = bytes.fromhex(str(receive_message(self._connection).get("challenge", "")))
+            challenge = secrets.token_bytes(32)
+            send_message(self._connection, {"response": challenge_response(authkey, b"viewer", broker_challenge),
+                                            "challenge": challenge.hex()})
+            reply = receive_message(self._connection)
+            if reply.get("reply") == "ERROR":
+                raise OSError(reply.get("error"))
+            response = str(reply.get("response")).encode()
+            if not hmac.compare_digest(response, challenge_response(authkey, b"broker", challenge).encode()):
+                raise OSError("Stream broker could not be authenticated")  # Camera password is not sent
+            send_message(self._connection, {"request": "SUBSCRIBE", "configuration": configuration})
+            reply = receive_message(self._connection)
+            if reply.get("reply") != "OK":
+                raise OSError(reply.get("error"))
+        except (OSError, EOFError, ValueError, TypeError) as exception:  # TypeError: e.g. "Capture Factory"
+            print("ERROR: Could not subscribe to stream broker %s:%i (%s)" % (address + (exception,)))
+            self.release()
+
+    def isOpened(self):
+        return self._connection is not None
+
+    def grab(self):
+        if self._connection is None:
+            return False
+        try:
+            send_message(self._connection, {"request": "GRAB"})
+            reply = receive_message(self._connection)  # Socket timeout when broker does not reply
+        except (OSError, EOFError, ValueError) as exception:
+            print("ERROR: Lost connection to stream broker (%s)" % exception)
+            self.release()
+            return False
+        if reply.get("reply") != "FRAME":
+            print("ERROR: Stream broker: %s" % reply.get("error"))
+            return False
+        self._frame = reply
+        return True
+
+    def retrieve(self, image=None):
+        if self._frame is None:
+            return False, None
+        frame = self._frame
+        self._frame = None
+        ring_name, shape, slot, frame_index = frame["ring"], frame["shape"], frame["slot"], frame["index"]
+        if self._shared_ring is None or self._shared_ring.name != ring_name:
+            self._close_ring()
+            try:
+                self._shared_ring = _attach_shared_memory(ring_name)
+            except FileNotFoundError:  # Frame shape has changed again since frame was grabbed
+                return False, None
+            self._ring_arrays = ring_arrays(self._shared_ring, shape)
+        slot_indexes, slot_frames = self._ring_arrays
+        for _ in range(BROKER_FRAME_SLOTS):
+            frame = slot_frames[slot].copy()
+            if slot_indexes[slot] == frame_index:
+                return True, frame
+            # Slot has been overwritten while copying (subscriber is too slow), newest frame is copied instead
+            slot = int(np.argmax(slot_indexes))
+            frame_index = slot_indexes[slot]
+        return False, None
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        self._close_ring()
+
+    def get(self, property_id):
+        return 0
+
+    def set(self, property_id, value):
+        return False
+
+    def _close_ring(self):
+        if self._shared_ring is not None:
+            self._ring_arrays = None
+            self._shared_ring.close()
+            self._shared_ring = None
+
+
+def ring_arrays(shared_ring, shape):  # (frame index per slot, frame slots) in shared memory of stream broker
+    header_size = BROKER_FRAME_SLOTS * 8
+    slot_indexes = np.ndarray((BROKER_FRAME_SLOTS,), np.int64, buffer=shared_ring.buf)
+    slot_frames = np.ndarray((BROKER_FRAME_SLOTS,) + tuple(shape), np.uint8, buffer=shared_ring.buf, offset=header_size)
+    return slot_indexes, slot_frames
+
+
+def broker_authkey(file=BROKER_AUTHKEY_FILE):  # Random key of this installation, file is readable by user only
+    try:
+        key_file = os.open(file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        if os.name == "posix" and os.stat(file).st_mode & 0o077:
+            raise PermissionError("Stream broker key file is accessible by other users: %s" % file)
+        with open(file, "rb") as key_file:
+            return key_file.read()
+    authkey = secrets.token_hex(32).encode()
+    with os.fdopen(key_file, "wb") as key_file:
+        key_file.write(authkey)
+    return authkey
+
+
+def challenge_response(authkey, role, challenge):  # role b"viewer" or b"broker", response is not valid for other role
+    return hmac.new(authkey, role + challenge, "sha256").hexdigest()
+
+
+def send_message(sock, message):  # Message (dict) as JSON with length header, no pickle from other processes
+    data = json.dumps(message).encode()
+    sock.sendall(_MESSAGE_HEADER.pack(len(data)) + data)
+
+
+def receive_message(sock):
+    size, = _MESSAGE_HEADER.unpack(_receive_bytes(sock, _MESSAGE_HEADER.size))
+    if size > BROKER_MESSAGE_SIZE:
+        raise ValueError("Stream broker message is too long (%i bytes)" % size)
+    message = json.loads(_receive_bytes(sock, size))
+    if not isinstance(message, dict):
+        raise ValueError("Stream broker message is not a JSON object")
+    return message
+
+
+def _receive_bytes(sock, size):
+    data = b""
+    while len(data) < size:
+        received = sock.recv(size - len(data))
+        if not received:
+            raise EOFError("Connection closed")
+        data += received
+    return data
+
+
+def _attach_shared_memory(name):  # Shared memory of broker must not be removed when subscriber process ends
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        from multiprocessing import resource_tracker
+        shared_ring = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shared_ring._name, "shared_memory")
+        return shared_ring
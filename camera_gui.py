@@ -0,0 +1,590 @@
+import os
+import math
+import threading
+import time
+import subprocess
+
+import numpy as np  # pip install numpy
+import cv2  # pip install OpenCV-python
+
+from PyQt5.QtWidgets import QMainWindow, QWidget, QLabel, QPushButton, QDesktopWidget  # pip install PyQt5
+from PyQt5.QtWidgets import QHBoxLayout, QVBoxLayout, QGridLayout
+from PyQt5.QtGui import QIcon, QImage, QPainter
+from PyQt5.QtCore import Qt, QObject, QSize, QTimer, pyqtSignal
+
+from gui_tools import GuiMessagebox
+from gui_tools import GuiStyling
+from live_camera import status_frame
+from pipeline_stats import PipelineStats
+from camera_messages import Command
+from camera_messages import CommandMessage
+from camera_messages import VideoFrame
+from camera_messages import StatusMessage
+from camera_messages import PhotoMessage
+from camera_messages import MotionMessage
+from camera_messages import RecordingMessage
+
+
+APPLICATION_CLOSE_DOWN_TIMEOUT = 5  # seconds, application quits even if a camera has not ended within this time
+STATS_INTERVAL = 1000  # milliseconds, update interval of live view statistics in status bar (and export file)
+
+GRID_DISPLAY_INTERVAL = 33  # milliseconds, minimum time between repaints of multi camera grid
+GRID_MOTION_TIME = 2  # seconds, motion is shown in tile status after it was detected
+
+APPLICATION_ICON = "photo_camera_icon.png"
+
+QIMAGE_FORMAT_BGR888 = getattr(QImage, "Format_BGR888", None)  # Qt 5.14+ (else channels are swapped by Qt)
+
+
+class CaptureWindow(QMainWindow):  # Live view of one camera, photo is taken, shown and saved
+
+    camera_data_arrived = pyqtSignal()  # Emitted from camera thread when new data for gui is available
+    photo_saved = pyqtSignal(str, object)  # Emitted from photo writer thread (file, error) when photo save has ended
+
+    def __init__(self, app, camera_live_view_name, camera_gui_frame_width, data_to_gui, data_from_gui, frames_to_gui,
+                 camera, file, photo_writer, save_burst=False, stats_export_file=None, motion_photo=False,
+                 start_time=None):
+        super().__init__()  # call QWidget constructor
+        self.data_to_gui = data_to_gui
+        self.data_from_gui = data_from_gui
+        self.frames_to_gui = frames_to_gui
+        self.camera = camera
+        self._app = app
+        self._close_down = None  # Camera is closing (window is hidden) when set
+        self._forced_close = False
+        self._take_photo_flag = True
+        self._photo_requested = False  # Full resolution photo frame has been requested from camera
+        self._show_photo = False
+        self._saving_photo = False
+        self._photo_frame = None  # Numpy frame of photo (full camera resolution)
+        self._burst_frames = []  # Frames from camera before photo was taken (saved with photo if save burst)
+        self._save_burst = save_burst
+        self._motion_photo = motion_photo  # Photo is taken when camera reports motion
+        self._recording = False  # Camera records video files (toggled by Record Video button)
+        self._photo_writer = photo_writer
+        self._photo_saves_pending = 0
+        self._photo_save_errors = {}
+        self._photo_preview_frame = None  # Preallocated buffer for photo scaled to gui width
+        GuiStyling(app)
+        self._photo_file = file
+        self._first_camera_frame = True
+        self._first_video_frame = True
+        self._start_time = start_time  # time.monotonic() of application start (startup times are measured from)
+
+        self.setWindowTitle("Photo Capture")
+        self.setWindowIcon(QIcon(APPLICATION_ICON))
+        self.setWindowFlags(Qt.Window | Qt.MSWindowsFixedSizeDialogHint)
+
+        self.statusBar().setSizeGripEnabled(False)
+        GuiStyling.set_style(self, "statusBar")
+        self._label_stats = QLabel("", self)
+        GuiStyling.set_style(self._label_stats, "QLabel")
+        self.statusBar().addPermanentWidget(self._label_stats)
+
+        self.buttons = {}
+        self.camera_gui_frame_width = camera_gui_frame_width
+        self._ui_layout(title=camera_live_view_name)
+        self.show()
+        self.camera_resolution = 0, 0
+        self._camera_resolution_change = True
+        self.camera_data_arrived.connect(self._camera_frame_update, Qt.QueuedConnection)
+        self.camera.notify = self.camera_data_arrived.emit
+        self.camera_data_arrived.emit()  # Catch up on data which arrived before the window existed
+        self.photo_saved.connect(self._photo_saved_update, Qt.QueuedConnection)
+        self.pipeline_stats = PipelineStats(camera_live_view_name)
+        self._stats_export_file = stats_export_file
+        self._stats_timer = QTimer(self)
+        self._stats_timer.timeout.connect(self._stats_update)
+        self._stats_timer.start(STATS_INTERVAL)
+        if self._start_time is not None:
+            QTimer.singleShot(0, self._window_shown)  # Called when event loop is running (window is shown)
+
+    def closeEvent(self, event):
+        event.ignore()  # Application quits when camera has ended (see _CloseDown)
+        if self._close_down is not None:
+            return
+        do_exit = True
+        if not self._forced_close:
+            answer = GuiMessagebox.yes_no("NO PHOTO CAPTURED", question="No photo saved.\n\nDo you want to quit anyway?")
+            if answer == "no":
+                do_exit = False
+        if do_exit:
+            self.hide()  # Window is gone at once, camera disconnects in the background
+            self._stats_timer.stop()
+            self._close_down = _CloseDown(self._app, [(self.camera, self.data_from_gui)])
+
+    def _ui_layout(self, title):
+        self.layout_main = QHBoxLayout()
+
+        self._layout_camera_main(self.layout_main, title)
+        self._layout_control_buttons(self.layout_main)
+
+        widget_main = QWidget()
+        widget_main.setLayout(self.layout_main)
+        self.setCentralWidget(widget_main)
+
+    def _layout_camera_main(self, master, title):
+        layout_camera_main = QVBoxLayout()
+
+        label_camera_title = QLabel(title, self)
+        GuiStyling.set_style(label_camera_title, "QLabel", "group")
+        layout_camera_main.addWidget(label_camera_title)
+
+        self._camera_view = _PreviewWidget(self.camera_gui_frame_width, self)
+        layout_camera_main.addWidget(self._camera_view)
+
+        master.addLayout(layout_camera_main)
+
+    def _layout_control_buttons(self, master):
+        layout_controls = QVBoxLayout()
+        self._button_take_photo = self._add_push_button(layout_controls, "Take Photo", "blue")
+        self._button_take_photo.setEnabled(False)
+        self._button_record = self._add_push_button(layout_controls, "Record Video", "red")
+        self._button_save_photo = self._add_push_button(layout_controls, "Save Photo", "green")
+        self._button_save_photo.setEnabled(False)
+        self._button_live_view = self._add_push_button(layout_controls, "Discard Photo", "yellow")
+        self._button_live_view.setEnabled(False)
+        self._button_reconnect = self._add_push_button(layout_controls, "Re-connect Camera", "utility button")
+        self._button_reconnect.setEnabled(False)
+        self._add_push_button(layout_controls, "IP Camera Utility", "utility button")
+        master.addLayout(layout_controls)
+
+    def _center_window(self):
+        # Center window on desktop: https://pythonprogramminglanguage.com/pyqt5-center-window
+        qt_rectangle = self.frameGeometry()
+        center_point = QDesktopWidget().availableGeometry().center()
+        qt_rectangle.moveCenter(center_point)
+        self.move(qt_rectangle.topLeft())
+
+    def _camera_frame_update(self):
+        while not self.data_to_gui.empty():  # Control data is never queued behind video frames
+            self._camera_data_update(self.data_to_gui.get_nowait())
+        message = self.frames_to_gui.get()  # Latest video frame (None if no new frame)
+        if message is not None:
+            self._camera_data_update(message)
+
+    def _camera_data_update(self, message):
+        image_frame = None
+        busy = True
+        video_frame = False
+
+        if isinstance(message, PhotoMessage):
+            self._photo_update(message.frame, message.burst_frames)
+            return
+        if isinstance(message, MotionMessage):
+            self._motion_update(message.change)
+            return
+        if isinstance(message, RecordingMessage):
+            self._recording_update(message)
+            return
+        if isinstance(message, VideoFrame):
+            image_frame = message.image
+            video_frame = True
+            busy = False
+        elif isinstance(message, StatusMessage):  # Pre-rendered status frame in gui width
+            image_frame = status_frame(message.text, self.camera_gui_frame_width, message.aspect_ratio)
+            self._photo_requested = False  # Camera status changed, photo must be requested again
+            busy = message.busy
+
+        ## button_id = self._get_widget_id(self.buttons, "Re-connect Camera")
+        ## button_id.setEnabled(not busy)
+        self._button_reconnect.setEnabled(not busy)
+
+        if self._show_photo:
+            if not self._saving_photo:
+                self._button_save_photo.setEnabled(True)
+                self._button_live_view.setEnabled(True)
+        else:
+            self._button_save_photo.setEnabled(False)
+            if image_frame is not None:
+                height, width, channel = image_frame.shape
+                if video_frame:  # Camera resolution of preview frame
+                    width, height = message.resolution
+                if self._camera_view.set_frame(image_frame):  # Size of camera view has changed
+                    self.adjustSize()
+                if video_frame:
+                    message.display_time = time.monotonic()
+                    self.pipeline_stats.add_frame(message)
+                if video_frame and self._first_video_frame:
+                    self._first_video_frame = False
+                    self._startup_time("first_frame", "Time to first frame")
+                if self._first_camera_frame:
+                    self._first_camera_frame = False
+                    QTimer.singleShot(0, self._center_window)  # Update window when widgets are finally update
+            if video_frame:
+                if self._take_photo_flag:
+                    if not self._photo_requested:
+                        self._photo_requested = True
+                        # Full resolution frame is only fetched for photo
+                        self.data_from_gui.put(CommandMessage(Command.BURST if self._save_burst else Command.SNAPSHOT))
+                else:
+                    self._button_take_photo.setEnabled(True)
+            else:
+                self._button_take_photo.setEnabled(False)
+                height, width = 0, 0
+            if self.camera_resolution[0] != width or self.camera_resolution[1] != height:
+                self._camera_resolution_change = True
+                self.camera_resolution = width, height
+            if self._camera_resolution_change:
+                self._camera_resolution_change = False
+                if not video_frame:
+                    status = "Camera Disconnected"
+                else:
+                    status = "Camera Resolution (width x height): %i x %i" % (self.camera_resolution[0], self.camera_resolution[1])
+                print(status)
+                self.statusBar().showMessage(status)
+
+    def _window_shown(self):
+        self._startup_time("window", "Time to window")
+
+    def _startup_time(self, stage, text):
+        if self._start_time is None:
+            return
+        startup_time = time.monotonic() - self._start_time
+        print("%s: %.2f s" % (text, startup_time))
+        self.pipeline_stats.set_startup_time(stage, startup_time)
+
+    def _stats_update(self):
+        queue_depth = len(self.frames_to_gui) + self.data_to_gui.qsize()
+        self.pipeline_stats.set_counters(dropped_frames=self.frames_to_gui.dropped_frames, queue_depth=queue_depth)
+        self._label_stats.setText(self.pipeline_stats.status_text())
+        if self._stats_export_file is not None:
+            try:
+                self.pipeline_stats.export(self._stats_export_file)
+            except OSError as exception:
+                print("ERROR: Could not export live view statistics: %s" % exception)
+                self._stats_export_file = None
+
+    def _motion_update(self, motion):
+        status = "Motion detected (%.1f %% of frame changed)" % (motion * 100)
+        if self._motion_photo and not self._take_photo_flag and not self._show_photo and not self._saving_photo:
+            self._take_photo_flag = True  # Photo is requested with next video frame
+            self._button_take_photo.setEnabled(False)
+            self._button_live_view.setEnabled(True)
+            status += " - Taking Photo"
+        print(status)
+        self.statusBar().showMessage(status)
+
+    def _recording_update(self, recording):
+        self._recording = recording.recording
+        self._button_record.setText("Stop Recording" if self._recording else "Record Video")
+        self._button_record.setEnabled(True)
+        if self._recording:
+            status = "Recording: %s" % recording.file
+        elif recording.error is not None:
+            status = "Recording failed: %s" % recording.error
+        else:
+            status = "Recording ended (dropped %i video frames)" % recording.dropped_frames
+        self.statusBar().showMessage(status)
+
+    def _photo_update(self, photo_frame, burst_frames):
+        if not self._take_photo_flag:
+            return  # Photo has been discarded while it was requested
+        self._take_photo_flag = False
+        self._photo_requested = False
+        print("Taking Photo")
+        self._show_photo = True
+        self._photo_frame = photo_frame
+        self._burst_frames = burst_frames
+        self._camera_view.set_frame(self._scaled_photo_frame(photo_frame))
+        self._button_save_photo.setEnabled(True)
+        self._button_live_view.setEnabled(True)
+
+    def _scaled_photo_frame(self, frame):  # Scale photo to gui width once (into preallocated buffer)
+        height, width, channel = frame.shape
+        scaled_width = self.camera_gui_frame_width
+        scaled_height = max(1, round(height * scaled_width / width))
+        if width <= scaled_width:
+            return frame  # Camera view scales small frames while painting
+        preview_shape = (scaled_height, scaled_width, channel)
+        if self._photo_preview_frame is None or self._photo_preview_frame.shape != preview_shape:
+            self._photo_preview_frame = np.empty(preview_shape, np.uint8)
+        cv2.resize(frame, (scaled_width, scaled_height), dst=self._photo_preview_frame, interpolation=cv2.INTER_AREA)
+        return self._photo_preview_frame
+
+    def _add_push_button(self, layout, button_text, style="default"):
+        button = QPushButton(button_text, self)
+        self.buttons[str(button)] = {"name": button_text, "id": button}
+        GuiStyling.set_style(button, "QPushButton", style)
+        button.clicked.connect(self._button_pushed)
+        layout.addWidget(button)
+        return button
+
+    def _button_pushed(self):
+        button_id = self.sender()
+        button_id_str = str(button_id)
+        button = self.buttons[button_id_str]
+        button_name = button["name"]
+        if button_name == "IP Camera Utility":
+            app = "IPUtility.exe"
+            print("Executing %s" % app)
+            subprocess.Popen([app], shell=True, creationflags=subprocess.SW_HIDE)
+            ## os.startfile(app)
+        elif button_name == "Re-connect Camera":
+            button_id.setEnabled(False)
+            self.data_from_gui.put(CommandMessage(Command.STOP))
+            self.data_from_gui.put(CommandMessage(Command.START))
+        elif button_name == "Record Video":
+            button_id.setEnabled(False)  # Enabled again when camera reports recording state
+            self.data_from_gui.put(CommandMessage(Command.RECORD, not self._recording))
+        elif button_name == "Take Photo":
+            button_id.setEnabled(False)
+            self._button_live_view.setEnabled(True)
+            self._take_photo_flag = True
+        elif button_name == "Discard Photo":
+            self._take_photo_flag = False  # Cancel photo if it is still requested from camera
+            self._photo_requested = False
+            self._show_photo = False
+            self._button_live_view.setEnabled(False)
+        elif button_name == "Save Photo":
+            self._saving_photo = True
+            self._button_save_photo.setEnabled(False)
+            self._button_live_view.setEnabled(False)
+            self.statusBar().showMessage("Saving Photo")
+            photos = [(self._photo_frame, self._photo_file)]
+            file_name, file_extension = os.path.splitext(self._photo_file)
+            for index, burst_frame in enumerate(self._burst_frames):
+                photos.append((burst_frame, "%s_burst_%02i%s" % (file_name, index, file_extension)))
+            self._photo_saves_pending = len(photos)
+            self._photo_save_errors = {}
+            for photo_frame, photo_file in photos:
+                self._photo_writer.save(photo_frame, photo_file, self.photo_saved.emit)
+
+    def _photo_saved_update(self, file, error):
+        self._photo_saves_pending -= 1
+        if error is not None:
+            self._photo_save_errors[file] = error
+        if self._photo_saves_pending > 0:
+            return  # Wait for all photos (burst) to be saved
+        do_exit = True
+        if self._photo_save_errors:
+            files = "\n".join(self._photo_save_errors)
+            question = "Failed to save photo to file:\n%s\n\nDo you want to quit anyway?" % files
+            answer = GuiMessagebox.yes_no("COULD NOT SAVE PHOTO", question=question)
+            if answer == "no":
+                do_exit = False
+        if do_exit:
+            self._forced_close = True
+            self.close()
+        else:
+            self._saving_photo = False
+            self._button_save_photo.setEnabled(True)
+            self._button_live_view.setEnabled(True)
+            self.statusBar().showMessage("Photo not saved")
+
+    def _get_widget_id(self, widget_collection, widget_name):
+        widget_id = None
+        for widget_id_str in widget_collection:
+            widget = widget_collection[widget_id_str]
+            if widget_name == widget["name"]:
+                widget_id = widget["id"]
+                break
+        return widget_id
+
+
+class GridWindow(QMainWindow):  # Live view of multiple cameras in a tiled grid
+
+    def __init__(self, app, cameras, tile_width, columns=None):
+        super().__init__()  # call QWidget constructor
+        self._app = app
+        self._close_down = None  # Cameras are closing (window is hidden) when set
+        GuiStyling(app)
+        self.setWindowTitle("Photo Capture")
+        self.setWindowIcon(QIcon(APPLICATION_ICON))
+        self.statusBar().setSizeGripEnabled(False)
+        GuiStyling.set_style(self, "statusBar")
+
+        self.scheduler = _DisplayScheduler(GRID_DISPLAY_INTERVAL)
+        if columns is None:
+            columns = max(1, math.ceil(math.sqrt(len(cameras))))
+        layout_grid = QGridLayout()
+        self.tiles = []
+        for index, (camera_name, camera_channels) in enumerate(cameras.items()):
+            tile = _CameraTile(camera_name, tile_width, *camera_channels)
+            layout_grid.addWidget(tile, index // columns, index % columns)
+            self.tiles.append(tile)
+            tile.camera.notify = self.scheduler.notify_function(tile)
+            self.scheduler.tile_changed(tile)  # Catch up on data which arrived before the tile existed
+        widget_main = QWidget()
+        widget_main.setLayout(layout_grid)
+        self.setCentralWidget(widget_main)
+        self.statusBar().showMessage("Double click camera view to re-connect camera")
+        self.show()
+
+    def closeEvent(self, event):
+        event.ignore()  # Application quits when all cameras have ended (see _CloseDown)
+        if self._close_down is None:
+            self.hide()  # Window is gone at once, cameras disconnect in the background
+            self._close_down = _CloseDown(self._app, [(tile.camera, tile.data_from_gui) for tile in self.tiles])
+
+
+class _CloseDown(QObject):  # Cameras end in their own threads, application quits when all of them have ended
+
+    camera_ended = pyqtSignal()  # Emitted from camera threads
+
+    def __init__(self, app, cameras):  # cameras: [(camera, data_from_gui), ...]
+        super().__init__()
+        self._app = app
+        self._cameras = [camera for camera, _ in cameras]
+        self.camera_ended.connect(self._camera_ended_update, Qt.QueuedConnection)
+        for camera, data_from_gui in cameras:
+            camera.notify = self.camera_ended.emit  # Live view is no longer updated
+            data_from_gui.put(CommandMessage(Command.QUIT))
+        self._timeout_timer = QTimer(self)
+        self._timeout_timer.setSingleShot(True)
+        self._timeout_timer.timeout.connect(self._timeout)
+        self._timeout_timer.start(APPLICATION_CLOSE_DOWN_TIMEOUT * 1000)
+        self.camera_ended.emit()  # Cameras which have already ended
+
+    def _camera_ended_update(self):
+        if all(camera.thread_has_ended() for camera in self._cameras):
+            self._timeout_timer.stop()
+            self._app.quit()
+
+    def _timeout(self):  # Hung camera threads end with the script (daemon threads)
+        cameras = sum(not camera.thread_has_ended() for camera in self._cameras)
+        print("ERROR: %i camera(s) did not end within %i s" % (cameras, APPLICATION_CLOSE_DOWN_TIMEOUT))
+        self._app.quit()
+
+
+class _DisplayScheduler(QObject):  # Shared by all grid tiles, repaints only the tiles which have new data
+
+    tiles_changed = pyqtSignal()
+
+    def __init__(self, interval):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._changed_tiles = set()
+        self._interval = interval / 1000
+        self._next_repaint_time = 0
+        self._repaint_timer = QTimer(self)
+        self._repaint_timer.setSingleShot(True)
+        self._repaint_timer.timeout.connect(self._repaint)
+        self.tiles_changed.connect(self._schedule_repaint, Qt.QueuedConnection)
+
+    def notify_function(self, tile):
+        return lambda: self.tile_changed(tile)
+
+    def tile_changed(self, tile):  # Called from camera threads
+        with self._lock:
+            schedule = not self._changed_tiles  # Repaint is already scheduled if other tiles are waiting
+            self._changed_tiles.add(tile)
+        if schedule:
+            self.tiles_changed.emit()
+
+    def _schedule_repaint(self):
+        if not self._repaint_timer.isActive():
+            delay = max(0, self._next_repaint_time - time.monotonic())
+            self._repaint_timer.start(int(delay * 1000))
+
+    def _repaint(self):
+        self._next_repaint_time = time.monotonic() + self._interval
+        with self._lock:
+            changed_tiles = self._changed_tiles
+            self._changed_tiles = set()
+        for tile in changed_tiles:
+            tile.camera_data_update()
+
+
+class _CameraTile(QWidget):
+
+    def __init__(self, camera_name, tile_width, data_to_gui, data_from_gui, frames_to_gui, camera):
+        super().__init__()  # call QWidget constructor
+        self.data_to_gui = data_to_gui
+        self.data_from_gui = data_from_gui
+        self.frames_to_gui = frames_to_gui
+        self.camera = camera
+        self.tile_width = tile_width
+        self._busy = True
+        self._last_motion_time = None  # Motion is shown in status of tile for a while
+        self.pipeline_stats = PipelineStats(camera_name)
+
+        layout_tile = QVBoxLayout()
+        self._label_title = QLabel(camera_name, self)
+        GuiStyling.set_style(self._label_title, "QLabel")
+        layout_tile.addWidget(self._label_title)
+        self._camera_view = _PreviewWidget(tile_width, self)
+        layout_tile.addWidget(self._camera_view)
+        self._label_status = QLabel("", self)
+        GuiStyling.set_style(self._label_status, "QLabel")
+        layout_tile.addWidget(self._label_status)
+        self.setLayout(layout_tile)
+
+    def mouseDoubleClickEvent(self, event):
+        if not self._busy:
+            self._busy = True
+            self.data_from_gui.put(CommandMessage(Command.STOP))
+            self.data_from_gui.put(CommandMessage(Command.START))
+
+    def camera_data_update(self):
+        message = None
+        while not self.data_to_gui.empty():  # Only newest status is shown
+            control_message = self.data_to_gui.get_nowait()
+            if isinstance(control_message, MotionMessage):
+                self._last_motion_time = time.monotonic()
+            elif isinstance(control_message, StatusMessage):
+                message = control_message
+        video_frame = self.frames_to_gui.get()
+        if video_frame is not None:
+            message = video_frame
+        if message is None:
+            return
+        if isinstance(message, VideoFrame):
+            image_frame = message.image
+            width, height = message.resolution
+            status = "%i x %i" % (width, height)
+            if self._last_motion_time is not None and time.monotonic() - self._last_motion_time < GRID_MOTION_TIME:
+                status += " - MOTION"
+            self._busy = False
+        else:
+            image_frame = status_frame(message.text, self.tile_width, message.aspect_ratio)
+            status = "Camera Disconnected"
+            self._busy = message.busy
+        self._camera_view.set_frame(image_frame)  # Frames are already scaled to tile width by camera
+        if video_frame is not None:
+            video_frame.display_time = time.monotonic()
+            self.pipeline_stats.add_frame(video_frame)
+        if self._label_status.text() != status:
+            self._label_status.setText(status)
+
+
+class _PreviewWidget(QWidget):  # Paints BGR numpy frames in a fixed width, without pixmap conversion
+
+    def __init__(self, width, parent=None):
+        super().__init__(parent)
+        self.preview_width = width
+        self._frame = None  # Numpy buffer of shown frame (referenced by QImage)
+        self._image = None
+        self._preview_sizes = {}  # Cached scale geometry {(frame width, frame height): QSize}
+        self.setAttribute(Qt.WA_OpaquePaintEvent)  # Frame covers whole widget, background is not erased
+        self.setFixedSize(width, round(width * 9 / 16))
+
+    def set_frame(self, frame):  # Returns True if size of widget has changed (parent needs to adjust its size)
+        height, width, channel = frame.shape
+        preview_size = self._preview_sizes.get((width, height))
+        if preview_size is None:
+            preview_size = QSize(self.preview_width, max(1, round(height * self.preview_width / width)))
+            self._preview_sizes[(width, height)] = preview_size
+        self._frame = frame
+        self._image = _qt_image(frame)
+        size_changed = preview_size != self.size()
+        if size_changed:
+            self.setFixedSize(preview_size)
+        self.update()  # Repaints are merged by Qt when frames arrive faster than the screen refresh
+        return size_changed
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self._image is None:
+            painter.fillRect(self.rect(), Qt.black)
+        else:
+            painter.drawImage(self.rect(), self._image)  # No scaling when frame is in widget size
+        painter.end()
+
+
+def _qt_image(frame):  # QImage referencing the BGR numpy buffer (caller keeps the buffer alive)
+    height, width, channel = frame.shape
+    step = frame.strides[0]
+    if QIMAGE_FORMAT_BGR888 is not None:
+        return QImage(frame.data, width, height, step, QIMAGE_FORMAT_BGR888)
+    return QImage(frame.data, width, height, step, QImage.Format_RGB888).rgbSwapped()
@@ -0,0 +1,93 @@
+import enum
+
+
+class Command(enum.Enum):  # Commands from gui to camera (data_from_gui)
+    START = enum.auto()
+    STOP = enum.auto()
+    QUIT = enum.auto()
+    SETTINGS = enum.auto()  # data: settings {"NAME", "CONFIG", "PREVIEW WIDTH", ...}
+    SNAPSHOT = enum.auto()  # Next full resolution frame is sent to gui as photo
+    BURST = enum.auto()  # Snapshot together with history frames
+    RECORD = enum.auto()  # data: True starts and False stops recording
+
+
+class CameraStatus(enum.Enum):  # Camera status shown by gui (see status_frame) instead of live view
+    CONNECTING = enum.auto()
+    DISCONNECTING = enum.auto()
+    RECONNECTING = enum.auto()
+    CONNECTION_FAILED = enum.auto()
+    CONNECTION_LOST = enum.auto()
+
+    @property
+    def failed(self):
+        return self in (CameraStatus.CONNECTION_FAILED, CameraStatus.CONNECTION_LOST)
+
+
+class CommandMessage:  # Gui to camera
+
+    __slots__ = ("command", "data")
+
+    def __init__(self, command, data=None):
+        self.command = command
+        self.data = data
+
+
+class VideoFrame:  # Camera to gui (frames_to_gui), live view frame
+
+    __slots__ = ("image", "resolution", "sequence", "grab_time", "decode_time", "convert_time", "enqueue_time",
+                 "display_time", "shared_slot")
+
+    def __init__(self, image, resolution, sequence, grab_time, decode_time, convert_time):
+        self.image = image  # BGR numpy frame (scaled down to preview width)
+        self.resolution = resolution  # (width, height) of camera frame
+        self.sequence = sequence  # Increasing frame number (gaps are frames which have not been sent to gui)
+        self.grab_time = grab_time  # time.monotonic() of every pipeline stage, see PIPELINE_STAGES
+        self.decode_time = decode_time
+        self.convert_time = convert_time
+        self.enqueue_time = None
+        self.display_time = None
+        self.shared_slot = None  # (shared memory ring name, slot) of image when camera runs in own process
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+
+class StatusMessage:  # Camera to gui (data_to_gui)
+
+    __slots__ = ("status", "text", "aspect_ratio", "busy")
+
+    def __init__(self, status, text, aspect_ratio, busy):
+        self.status = status  # CameraStatus
+        self.text = text
+        self.aspect_ratio = aspect_ratio  # Of last camera frame
+        self.busy = busy  # Camera is connecting or disconnecting (re-connect is not possible)
+
+
+class PhotoMessage:  # Camera to gui (data_to_gui)
+
+    __slots__ = ("frame", "burst_frames")
+
+    def __init__(self, frame, burst_frames=()):
+        self.frame = frame  # Full resolution BGR numpy frame
+        self.burst_frames = burst_frames  # History frames, oldest frame first
+
+
+class MotionMessage:  # Camera to gui (data_to_gui)
+
+    __slots__ = ("change", "time")
+
+    def __init__(self, change, time):
+        self.change = change  # Fraction of changed pixels
+        self.time = time  # time.time() of frame
+
+
+class RecordingMessage:  # Camera to gui (data_to_gui)
+
+    __slots__ = ("recording", "file", "dropped_frames", "error")
+
+    def __init__(self, recording, file=None, dropped_frames=0, error=None):
+        self.recording = recording
+        self.file = file  # Current segment file while recording
+        self.dropped_frames = dropped_frames  # Frames not recorded because writer fell behind (when recording ends)
+        self.error = error  # Why recording has ended by itself (e.g. FFmpeg has ended)
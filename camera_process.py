@@ -0,0 +1,258 @@
+import time
+import threading
+import queue
+import weakref
+import collections
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np  # pip install numpy
+
+from live_camera import FrameBuffer
+from live_camera import LiveCamera
+from camera_messages import Command
+from camera_messages import StatusMessage
+from camera_messages import VideoFrame
+
+
+SHARED_FRAME_SLOTS = 5  # Shared memory frame slots per camera (shown + gui buffer + transfer + camera buffer + scaling)
+
+
+class ProcessCamera:  # Same interface as LiveCamera, but camera capture and decoding run in a separate process
+
+    def __init__(self, data_to_gui, data_from_gui, frames_to_gui):
+        self.thread_ended = False
+        self.data_to_gui = data_to_gui
+        self.data_from_gui = data_from_gui
+        self.frames_to_gui = frames_to_gui
+        self.notify = None  # Called (from relay thread) when new data for gui is available
+        self._shared_rings = {}  # Shared memory frame rings created by camera process
+        self._camera_dropped_frames = 0  # Frames dropped in camera process (already added to frames_to_gui)
+        context = multiprocessing.get_context("spawn")  # Same behaviour on all platforms
+        self._commands = context.Queue()
+        self._events = context.Queue()
+        self._free_slots = context.Queue()
+        self.frames_to_gui.release = self._release_frame
+        self.camera_process = context.Process(target=_camera_process, name=__class__.__name__,
+                                              args=(self._commands, self._events, self._free_slots))
+        self.camera_process.daemon = True  # stop process when script exits
+        self.camera_process.start()
+        for thread_target in (self._command_thread, self._event_thread):
+            thread_name = __class__.__name__ + "." + thread_target.__name__
+            thread = threading.Thread(target=thread_target, name=thread_name)
+            thread.setDaemon(True)  # stop thread when script exits
+            thread.start()
+
+    def thread_has_ended(self):
+        return self.thread_ended
+
+    def _command_thread(self):  # Forward gui commands (START, STOP, QUIT, SETTINGS, ...) to camera process
+        while True:
+            message = self.data_from_gui.get()
+            self._commands.put(message)
+            if message.command is Command.QUIT:
+                break
+
+    def _event_thread(self):  # Forward camera process data to gui
+        while True:
+            try:
+                event = self._events.get(timeout=1)
+            except queue.Empty:
+                if not self.camera_process.is_alive():
+                    print("ERROR: Camera process has ended unexpectedly")
+                    break
+                continue
+            event_type, event_data = event
+            if event_type == "ENDED":
+                break
+            if event_type == "RING":
+                ring_name, slot_shape = event_data
+                self._shared_rings[ring_name] = shared_memory.SharedMemory(name=ring_name), slot_shape
+                self._close_unused_rings(ring_name)
+            elif event_type == "FRAME":
+                ring_name, slot, frame_shape, video_frame, dropped_frames = event_data
+                self.frames_to_gui.count_dropped(dropped_frames - self._camera_dropped_frames)
+                self._camera_dropped_frames = dropped_frames
+                shared_ring, slot_shape = self._shared_rings[ring_name]
+                slot_frames = np.ndarray((SHARED_FRAME_SLOTS,) + slot_shape, np.uint8, buffer=shared_ring.buf)
+                height, width, channel = frame_shape
+                video_frame.image = slot_frames[slot, :height, :width]  # No copy of pixel data
+                video_frame.shared_slot = ring_name, slot
+                video_frame.enqueue_time = time.monotonic()  # Enqueued for gui in this process
+                if self.frames_to_gui.put(video_frame):
+                    self._notify_gui()
+            else:
+                if isinstance(event_data, StatusMessage):
+                    self.frames_to_gui.clear()  # Stale video frames must not be shown after the status
+                self.data_to_gui.put(event_data)
+                self._notify_gui()
+        self.camera_process.join(timeout=1)
+        self.thread_ended = True
+        self._notify_gui()  # Gui closes when camera process has ended
+
+    def _release_frame(self, frame, dropped):  # Shared memory slot can be reused by camera process
+        if frame.shared_slot is not None:
+            latency = None if frame.display_time is None else frame.display_time - frame.grab_time
+            self._free_slots.put((frame.shared_slot, latency, dropped))  # Feedback for adaptive quality
+
+    def _close_unused_rings(self, current_ring_name):
+        for ring_name in list(self._shared_rings):
+            if ring_name != current_ring_name:
+                shared_ring, _ = self._shared_rings[ring_name]
+                try:
+                    shared_ring.close()
+                except BufferError:  # Frames of old ring are still in use, try again at next ring change
+                    continue
+                del self._shared_rings[ring_name]
+
+    def _notify_gui(self):
+        notify = self.notify
+        if notify is not None:
+            notify()
+
+
+def _camera_process(commands, events, free_slots):
+    data_to_gui = queue.Queue()
+    data_from_gui = queue.Queue()
+    shared_ring = _SharedFrameRing(events)
+    frames_to_gui = FrameBuffer(1, release=shared_ring.release_frame)
+    camera = LiveCamera(data_to_gui, data_from_gui, frames_to_gui)
+    camera.preview_buffer = shared_ring.preview_buffer  # Live view frames are scaled straight into shared memory
+    data_arrived = threading.Event()
+    camera.notify = data_arrived.set
+
+    def command_thread():
+        while True:
+            message = commands.get()
+            data_from_gui.put(message)
+            if message.command is Command.QUIT:
+                camera.camera_thread.join()
+                data_arrived.set()
+                break
+
+    def free_slot_thread():  # Shared memory slots released by gui process
+        while True:
+            shared_slot, latency, dropped = free_slots.get()
+            if latency is not None or dropped:  # No feedback for frames taken but not painted (photo is shown)
+                camera.frame_feedback(latency)
+            shared_ring.free_slot(shared_slot)
+            data_arrived.set()
+
+    for thread_target in (command_thread, free_slot_thread):
+        thread = threading.Thread(target=thread_target, name=_camera_process.__name__ + "." + thread_target.__name__)
+        thread.setDaemon(True)  # stop thread when process exits
+        thread.start()
+
+    video_frame = None  # Frame (not scaled into shared memory) waiting for a free shared memory slot
+    while not camera.thread_has_ended():
+        data_arrived.wait()
+        data_arrived.clear()
+        while not data_to_gui.empty():
+            message = data_to_gui.get_nowait()
+            if isinstance(message, StatusMessage):
+                video_frame = None
+            events.put(("DATA", message))  # Control data (rare) is pickled
+        if video_frame is None or not frames_to_gui.empty():
+            video_frame = frames_to_gui.get() or video_frame  # Decode thread waits while this frame is pending
+        if video_frame is None:
+            continue
+        shared_slot = shared_ring.slot_of(video_frame.image)
+        if shared_slot is None:
+            if shared_ring.is_replaced_slot(video_frame.image):  # Scaled into ring of previous frame shape
+                video_frame = None
+                continue
+            shared_slot = shared_ring.copy_to_slot(video_frame.image)  # Full resolution live view
+            if shared_slot is None:  # Gui is still using all slots
+                continue
+        video_frame.shared_slot = shared_slot  # Slot is released by gui process from now on
+        ring_name, slot = shared_slot
+        shared_frame = VideoFrame(None, video_frame.resolution, video_frame.sequence, video_frame.grab_time,
+                                  video_frame.decode_time, video_frame.convert_time)
+        frame_event = ring_name, slot, video_frame.shape, shared_frame, frames_to_gui.dropped_frames
+        events.put(("FRAME", frame_event))  # Pixel data is not pickled
+        video_frame = None
+    events.put(("ENDED", None))
+    shared_ring.close()
+
+
+class _SharedFrameRing:  # Shared memory frame slots of camera process, one ring per live view frame shape
+
+    def __init__(self, events):
+        self._events = events
+        self._lock = threading.Lock()
+        self._shared_memory = None
+        self._slot_frames = None  # Numpy view of all slots
+        self._free_slots = collections.deque()  # Slots of current ring which are not used by gui or decode thread
+        self._replaced_rings = []  # Shared memory of replaced rings, closed when their frames are no longer used
+        self._replaced_slot_frames = weakref.WeakValueDictionary()  # {id: slot frames} of replaced rings
+
+    def preview_buffer(self, shape):  # Called by decode thread, free slot to scale live view frame into (or None)
+        with self._lock:
+            if self._slot_frames is None or self._slot_frames.shape[1:] != shape:
+                self._new_ring(shape)
+            if not self._free_slots:
+                return None
+            return self._slot_frames[self._free_slots.popleft()]
+
+    def copy_to_slot(self, frame):  # Returns (ring name, slot) of copy (None if no free slot)
+        with self._lock:
+            if self._slot_frames is None or self._slot_frames.shape[1:] != frame.shape:
+                self._new_ring(frame.shape)
+            if not self._free_slots:
+                return None
+            slot = self._free_slots.popleft()
+            self._slot_frames[slot] = frame
+            return self._shared_memory.name, slot
+
+    def slot_of(self, frame):  # (ring name, slot) if frame is a slot of current ring, else None
+        with self._lock:
+            if self._slot_frames is None or frame.base is not self._slot_frames:
+                return None
+            slot = (frame.ctypes.data - self._slot_frames.ctypes.data) // frame.nbytes
+            return self._shared_memory.name, slot
+
+    def is_replaced_slot(self, frame):
+        with self._lock:
+            return self._replaced_slot_frames.get(id(frame.base)) is frame.base
+
+    def free_slot(self, shared_slot):
+        ring_name, slot = shared_slot
+        with self._lock:
+            if self._shared_memory is not None and ring_name == self._shared_memory.name:  # Old slots are discarded
+                self._free_slots.append(slot)
+
+    def release_frame(self, frame, dropped):  # Frame dropped by frame buffer before it was sent to gui
+        if frame.shared_slot is None:
+            shared_slot = self.slot_of(frame.image)
+            if shared_slot is not None:
+                self.free_slot(shared_slot)
+
+    def close(self):
+        with self._lock:
+            self._replace_ring()
+            self._close_replaced_rings()
+
+    def _new_ring(self, shape):
+        self._replace_ring()
+        size = SHARED_FRAME_SLOTS * int(np.prod(shape))
+        self._shared_memory = shared_memory.SharedMemory(create=True, size=size)
+        self._slot_frames = np.ndarray((SHARED_FRAME_SLOTS,) + tuple(shape), np.uint8, buffer=self._shared_memory.buf)
+        self._free_slots = collections.deque(range(SHARED_FRAME_SLOTS))
+        self._events.put(("RING", (self._shared_memory.name, tuple(shape))))
+        self._close_replaced_rings()
+
+    def _replace_ring(self):
+        if self._shared_memory is not None:
+            self._replaced_slot_frames[id(self._slot_frames)] = self._slot_frames
+            self._replaced_rings.append(self._shared_memory)
+            self._shared_memory.unlink()  # Gui process keeps its own mapping until old frames are released
+            self._shared_memory = None
+            self._slot_frames = None
+
+    def _close_replaced_rings(self):
+        for replaced_ring in list(self._replaced_rings):
+            try:
+                replaced_ring.close()
+            except BufferError:  # Frames of ring are still in use (e.g. being scaled), try again at next ring change
+                continue
+            self._replaced_rings.remove(replaced_ring)
@@ -1,9 +1,8 @@
 import time
 import threading
 
-from PyQt5.QtWidgets import *  # pip install PyQt5
-from PyQt5.QtGui import *
-from PyQt5.QtCore import *
+from PyQt5.QtWidgets import QApplication, QMainWindow, QDialog, QMessageBox, QLabel, QVBoxLayout  # pip install PyQt5
+from PyQt5.QtCore import Qt, QTimer
 
 
 class GuiMessagebox:
@@ -46,6 +45,7 @@ GUI_STYLES = \
         "QPushButton blue": {"": {"background-color": "lightblue"}},
         "QPushButton green": {"": {"background-color": "lightgreen"}},
         "QPushButton yellow": {"": {"background-color": "lightyellow"}},
+        "QPushButton red": {"": {"background-color": "lightcoral"}},
     }
 
 
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+import concurrent.futures
+
+# Local imports (no PyQt, runs on servers without display)
+script_path_file = __file__
+script_path = os.path.dirname(script_path_file)
+sys.path.append(script_path)
+from live_camera import FrameBuffer
+from live_camera import LiveCamera
+from camera_messages import Command
+from camera_messages import CommandMessage
+from camera_messages import PhotoMessage
+from camera_messages import StatusMessage
+from photo_writer import write_photo
+
+
+WARM_UP_TIME = 1.0  # seconds of live frames before photo is taken (camera exposure and white balance settle)
+BEST_OF_FRAMES = 5  # Photo is the sharpest of the last frames from camera
+CAPTURE_TIMEOUT = 15  # seconds, from connecting to camera until photo frame is received
+CLOSE_DOWN_TIMEOUT = 5  # seconds
+HEADLESS_PREVIEW_WIDTH = 160  # Live frames are only counted, keep their conversion cheap
+
+
+def capture_photo(configuration, photo_file, warm_up=WARM_UP_TIME, best_of=BEST_OF_FRAMES, timeout=CAPTURE_TIMEOUT,
+                  photo_writer=None, camera_name="camera", photo_encoder_settings=None):
+    # Connect, warm up, save sharpest of best_of frames (raises OSError or ValueError if photo is not saved)
+    data_to_gui = queue.Queue()
+    data_from_gui = queue.Queue()
+    frames_to_gui = FrameBuffer(1)
+    camera = LiveCamera(data_to_gui, data_from_gui, frames_to_gui)
+    data_arrived = threading.Event()
+    camera.notify = data_arrived.set
+    configuration = dict(configuration, Reconnect=False)  # Failed connection is reported to caller instead
+    settings = {"NAME": camera_name, "CONFIG": configuration, "PREVIEW WIDTH": HEADLESS_PREVIEW_WIDTH,
+                "HISTORY FRAMES": best_of}
+    data_from_gui.put(CommandMessage(Command.SETTINGS, settings))
+    data_from_gui.put(CommandMessage(Command.START))
+    try:
+        photo_frame = _wait_for_photo(data_to_gui, data_from_gui, frames_to_gui, data_arrived, warm_up, best_of,
+                                      timeout)
+    finally:
+        camera.notify = None
+        data_from_gui.put(CommandMessage(Command.QUIT))
+        camera.camera_thread.join(timeout=CLOSE_DOWN_TIMEOUT)
+    if photo_writer is None:  # Encoded in calling thread, no writer thread per photo
+        write_photo(photo_frame, photo_file, photo_encoder_settings)
+    else:
+        photo_writer.write(photo_frame, photo_file)
+    print("Photo saved to file: %s" % photo_file)
+    return photo_file
+
+
+def capture_photos(configurations, photo_files, warm_up=WARM_UP_TIME, best_of=BEST_OF_FRAMES,
+                   timeout=CAPTURE_TIMEOUT, photo_encoder_settings=None):
+    # Capture from cameras in parallel, photo_files: {camera name: file}, returns {camera name: error (None if saved)}
+    results = {}  # photo_encoder_settings e.g. {".jpg": [cv2.IMWRITE_JPEG_QUALITY, 90]}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(photo_files))) as executor:
+        futures = {}
+        for camera_name, photo_file in photo_files.items():
+            futures[camera_name] = executor.submit(capture_photo, configurations[camera_name], photo_file, warm_up,
+                                                   best_of, timeout, None, camera_name, photo_encoder_settings)
+        for camera_name, future in futures.items():
+            try:
+                future.result()
+                results[camera_name] = None
+            except (OSError, ValueError) as exception:
+                results[camera_name] = str(exception)
+                print("ERROR: Could not capture photo from camera: %s (%s)" % (camera_name, exception))
+    return results
+
+
+def _wait_for_photo(data_to_gui, data_from_gui, frames_to_gui, data_arrived, warm_up, best_of, timeout):
+    end_time = time.monotonic() + timeout
+    first_frame_time = None
+    frames = 0
+    snapshot_requested = False
+    while True:
+        remaining_time = end_time - time.monotonic()
+        if remaining_time <= 0:
+            raise TimeoutError("No photo from camera within %.0f s" % timeout)
+        data_arrived.wait(remaining_time)
+        data_arrived.clear()
+        while not data_to_gui.empty():
+            message = data_to_gui.get_nowait()
+            if isinstance(message, PhotoMessage):
+                return message.frame
+            if isinstance(message, StatusMessage) and message.status.failed:
+                raise ConnectionError(message.text.capitalize())
+        if frames_to_gui.get() is None:
+            continue
+        frames += 1
+        if first_frame_time is None:
+            first_frame_time = time.monotonic()
+        warmed_up = frames >= best_of and time.monotonic() - first_frame_time >= warm_up
+        if warmed_up and not snapshot_requested:
+            snapshot_requested = True
+            data_from_gui.put(CommandMessage(Command.SNAPSHOT))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture photos from cameras without gui")
+    parser.add_argument("config", nargs="?",
+                        help="JSON file with camera configurations {camera name: configuration}")
+    parser.add_argument("--camera", nargs="+", help="names of cameras in config file (default: all cameras)")
+    parser.add_argument("--usb", type=int, help="USB camera ID (instead of config file)")
+    parser.add_argument("--output", default="{name}.png",
+                        help="photo file, {name} is replaced by camera name (default: {name}.png)")
+    parser.add_argument("--warm-up", type=float, default=WARM_UP_TIME, help="seconds of live frames before photo")
+    parser.add_argument("--best-of", type=int, default=BEST_OF_FRAMES, help="photo is sharpest of this many frames")
+    parser.add_argument("--timeout", type=float, default=CAPTURE_TIMEOUT, help="seconds per camera")
+    args = parser.parse_args()
+
+    if args.usb is not None:
+        configurations = {"USB Camera %i" % args.usb: {"USB ID": args.usb}}
+    elif args.config is not None:
+        with open(args.config) as config_file:
+            configurations = json.load(config_file)
+    else:
+        parser.error("config file or --usb is required")
+    camera_names = args.camera or list(configurations)
+    unknown_cameras = [camera_name for camera_name in camera_names if camera_name not in configurations]
+    if unknown_cameras:
+        parser.error("unknown cameras: %s" % ", ".join(unknown_cameras))
+    if len(camera_names) > 1 and "{name}" not in args.output:
+        parser.error("--output must contain {name} when capturing from several cameras")
+    photo_files = {camera_name: args.output.replace("{name}", camera_name) for camera_name in camera_names}
+    results = capture_photos(configurations, photo_files, args.warm_up, args.best_of, args.timeout)
+    return 1 if any(error is not None for error in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
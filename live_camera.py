@@ -0,0 +1,630 @@
+import os
+import time
+import queue
+import random
+import functools
+import threading
+import collections
+
+import numpy as np  # pip install numpy
+import cv2  # pip install OpenCV-python
+
+from motion_detector import MotionDetector
+from motion_detector import MOTION_EVENT_THRESHOLD
+from adaptive_quality import AdaptiveQuality
+from camera_messages import Command
+from camera_messages import CameraStatus
+from camera_messages import StatusMessage
+from camera_messages import VideoFrame
+from camera_messages import PhotoMessage
+from camera_messages import MotionMessage
+from camera_messages import RecordingMessage
+
+
+HISTORY_BYTE_BUDGET = 128 * 1024 * 1024  # Maximum memory used for history of full resolution frames (burst photos)
+
+# IP camera connection (can be overruled per camera in camera configuration, e.g. "Transport": "udp")
+CAMERA_OPEN_TIMEOUT = 5  # seconds
+CAMERA_READ_TIMEOUT = 5  # seconds
+RTSP_TRANSPORT = "tcp"  # "tcp" or "udp"
+RTSP_LOW_LATENCY = True  # FFmpeg low latency flags (no input buffering)
+RECONNECT = True  # Automatic reconnect when camera connection is lost
+RECONNECT_DELAY_MIN = 0.5  # seconds, delay before first reconnect attempt (doubled for every failed attempt)
+RECONNECT_DELAY_MAX = 30  # seconds
+CAMERA_RELEASE_TIMEOUT = 2  # seconds, a capture handle which is not released within this time is abandoned
+RECONNECT_JITTER = 0.2  # Random part of reconnect delay (fraction), cameras rebooted together do not reconnect together
+ADAPTIVE_QUALITY = True  # Live view frame rate and resolution are lowered when gui falls behind (photos are not)
+PREVIEW_BUFFERS = 4  # Preallocated live view frames which are reused by decode thread (when released by gui)
+STATUS_FRAME_CACHE_SIZE = 32  # Number of pre-rendered status frames (text, width, aspect ratio) kept in memory
+
+_ffmpeg_options_lock = threading.Lock()  # FFmpeg capture options are read from (process global) environment
+
+
+class FrameBuffer:  # Thread safe bounded ring of video frames, the newest frame wins when the ring is full
+
+    def __init__(self, depth=1, release=None):
+        self.depth = max(1, int(depth))
+        self.release = release  # Called (frame, dropped) when frame is dropped or no longer used by consumer
+        self._consumed_frame = None  # Last frame handed out to consumer
+        self._slots = [None] * self.depth  # Preallocated ring slots
+        self._read_index = 0
+        self._count = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._closed = False
+        self.dropped_frames = 0
+
+    def put(self, frame):  # Returns True if the buffer was empty (consumer needs to be notified)
+        dropped_frame = None
+        with self._lock:
+            was_empty = self._count == 0
+            if self._count == self.depth:  # Drop the oldest (stale) frame
+                dropped_frame = self._slots[self._read_index]
+                self._slots[self._read_index] = None
+                self._read_index = (self._read_index + 1) % self.depth
+                self._count -= 1
+                self.dropped_frames += 1
+            self._slots[(self._read_index + self._count) % self.depth] = frame
+            self._count += 1
+            self._changed.notify_all()
+        self._release_frames([dropped_frame], dropped=True)  # Consumer has not taken the frame in time
+        return was_empty
+
+    def get(self, block=False):  # Returns None if no frame (or buffer closed while blocking)
+        with self._lock:
+            if block:
+                self._changed.wait_for(lambda: self._count > 0 or self._closed)
+            if self._count == 0:
+                return None
+            frame = self._slots[self._read_index]
+            self._slots[self._read_index] = None  # Release frame memory as soon as possible
+            self._read_index = (self._read_index + 1) % self.depth
+            self._count -= 1
+            self._changed.notify_all()
+            previous_frame = self._consumed_frame
+            if self.release is not None:
+                self._consumed_frame = frame
+        self._release_frames([previous_frame])
+        return frame
+
+    def count_dropped(self, frames=1):  # Frames dropped before they reached the buffer (e.g. not retrieved)
+        with self._lock:
+            self.dropped_frames += frames
+
+    def wait_for_space(self):  # Block until consumer has made room for a new frame (or buffer is closed)
+        with self._lock:
+            self._changed.wait_for(lambda: self._count < self.depth or self._closed)
+
+    def clear(self):
+        with self._lock:
+            cleared_frames = [self._slots[index] for index in range(self.depth)]
+            for index in range(self.depth):
+                self._slots[index] = None
+            self._read_index = 0
+            self._count = 0
+            self._changed.notify_all()
+        self._release_frames(cleared_frames)
+
+    def close(self):  # Wake up all waiting threads for good
+        with self._lock:
+            self._closed = True
+            self._changed.notify_all()
+
+    def empty(self):
+        with self._lock:
+            return self._count == 0
+
+    def __len__(self):
+        with self._lock:
+            return self._count
+
+    def _release_frames(self, frames, dropped=False):
+        if self.release is not None:
+            for frame in frames:
+                if frame is not None:
+                    self.release(frame, dropped)
+
+
+class FrameHistory:  # Thread safe ring of the last full resolution frames, preallocated when frame shape is known
+
+    def __init__(self, frames=0, byte_budget=HISTORY_BYTE_BUDGET):
+        self._lock = threading.Lock()
+        self._frames = None  # Preallocated frames (history depth, height, width, channel)
+        self._index = 0
+        self._count = 0
+        self.configure(frames, byte_budget)
+
+    def configure(self, frames, byte_budget=HISTORY_BYTE_BUDGET):
+        with self._lock:
+            self.max_frames = max(0, int(frames))
+            self.byte_budget = byte_budget
+            self._frames = None
+            self._index = 0
+            self._count = 0
+
+    def add(self, frame):
+        with self._lock:
+            if self.max_frames == 0:
+                return
+            if self._frames is None or self._frames.shape[1:] != frame.shape:
+                depth = min(self.max_frames, self.byte_budget // frame.nbytes)
+                if depth == 0:
+                    return  # Frame is too large for byte budget
+                self._frames = np.empty((depth,) + frame.shape, frame.dtype)
+                self._index = 0
+                self._count = 0
+            np.copyto(self._frames[self._index], frame)
+            self._index = (self._index + 1) % len(self._frames)
+            self._count = min(self._count + 1, len(self._frames))
+
+    def burst(self):  # Copy of history frames, oldest frame first
+        with self._lock:
+            if self._count == 0:
+                return []
+            depth = len(self._frames)
+            first_index = (self._index - self._count) % depth
+            return [self._frames[(first_index + offset) % depth].copy() for offset in range(self._count)]
+
+    def sharpest(self):  # Copy of the history frame with highest sharpness (None if history is empty)
+        with self._lock:
+            if self._count == 0:
+                return None
+            depth = len(self._frames)
+            indexes = [(self._index - 1 - offset) % depth for offset in range(self._count)]  # Newest frame first
+            sharpest_index = max(indexes, key=lambda index: sharpness(self._frames[index]))
+            return self._frames[sharpest_index].copy()
+
+    def clear(self):
+        with self._lock:
+            self._index = 0
+            self._count = 0
+
+
+@functools.lru_cache(maxsize=STATUS_FRAME_CACHE_SIZE)
+def status_frame(text, width, aspect_ratio):  # Black frame with status text (shared, read only)
+    height = int(width / aspect_ratio)
+    text_image = np.zeros((height, width, 3), np.uint8)  # Black frame
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    org = (20, int(height/2))
+    font_scale = (width / 960)
+    color = (0, 255, 255)  # Yellow (BGR)
+    thickness = 2
+    text_image = cv2.putText(text_image, text, org, font, font_scale, color, thickness, cv2.LINE_AA)
+    text_image.setflags(write=False)
+    return text_image
+
+
+def sharpness(frame):  # Variance of Laplacian, low value means blurred (e.g. motion blur) frame
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.Laplacian(gray_frame, cv2.CV_32F).var()
+
+
+class LiveCamera:
+
+    def __init__(self, data_to_gui, data_from_gui, frames_to_gui):
+        self.thread_ended = False
+        self.quit = False
+        self.capture = None
+        self.data_to_gui = data_to_gui
+        self.data_from_gui = data_from_gui
+        self.frames_to_gui = frames_to_gui
+        self.notify = None  # Called (from camera threads) when new data for gui is available
+        self.frame_aspect_ratio = 16/9  # Just a temporary value until first frame has been captured
+        self._grabbed_frames = FrameBuffer(1)  # Newest retrieved (not yet converted) frame for decode thread
+        self._decode_ready = threading.Event()  # Decode thread and gui are ready for a new frame
+        self._snapshot_requested = threading.Event()  # Next full resolution frame is sent to gui as photo frame
+        self._burst_requested = threading.Event()  # History frames are sent to gui together with photo frame
+        self.history = FrameHistory()  # Last full resolution frames, sharpest frame is used as photo frame
+        self.connection_attempts = collections.deque(maxlen=100)  # {"TIME", "STREAM", "FIRST FRAME TIME"} per attempt
+        self.preview_width = None  # Live view frames are scaled down to this width by decode thread
+        self._preview_geometry = None  # ((camera width, camera height, preview width), preview size) of last frame
+        self._preview_buffers = collections.deque(maxlen=PREVIEW_BUFFERS)  # Scaled live view frames released by gui
+        self.preview_buffer = None  # Called (from decode thread) with live view frame shape, returns buffer or None
+        if self.frames_to_gui.release is None:  # Process backend (gui process) releases shared memory slots instead
+            self.frames_to_gui.release = self._release_frame
+        self.motion_detector = None  # Unchanged frames are not sent to gui, motion is reported to gui
+        self.unchanged_frames = 0
+        self.adaptive_quality = None  # Live view quality from gui display latency and dropped frames
+        self.recorder = None  # Full resolution frames are recorded to video files while set
+        self._recording_settings = {}
+        self._gui_lock = threading.Lock()
+        self._frame_generation = 0  # Increased on every camera status change, older frames are discarded
+        self._captures_to_release = None  # Capture handles are released by release thread (may hang)
+        self._releases_pending = 0  # Capture handles of current release thread which are not released yet
+        self._release_start_time = None  # time.monotonic() when current release thread has called release()
+        self._release_changed = threading.Condition()
+        self._start_release_thread()
+        thread_target = self._decode_thread
+        thread_name = __class__.__name__ + "." + thread_target.__name__
+        self.decode_thread = threading.Thread(target=thread_target, name=thread_name)
+        self.decode_thread.setDaemon(True)  # stop thread when script exits
+        self.decode_thread.start()
+        thread_target = self._camera_thread
+        thread_name = __class__.__name__ + "." + thread_target.__name__
+        self.camera_thread = threading.Thread(target=thread_target, name=thread_name)
+        self.camera_thread.setDaemon(True)  # stop thread when script exits
+        self.camera_thread.start()
+
+    def thread_has_ended(self):
+        return self.thread_ended
+
+    def _settings(self, settings):
+        self.camera = settings["CONFIG"]
+        self.preview_width = settings.get("PREVIEW WIDTH")
+        self.history.configure(settings.get("HISTORY FRAMES", 0), settings.get("HISTORY BYTE BUDGET", HISTORY_BYTE_BUDGET))
+        self.motion_detector = None
+        if settings.get("MOTION DETECTION", False):
+            self.motion_detector = MotionDetector(settings.get("MOTION THRESHOLD", MOTION_EVENT_THRESHOLD))
+        self.adaptive_quality = AdaptiveQuality() if settings.get("ADAPTIVE QUALITY", ADAPTIVE_QUALITY) else None
+        self._recording_settings = {key: value for key, value in settings.items() if key.startswith("RECORDING")}
+
+    def _start(self):
+        if "IP" in self.camera:
+            self.stream = self.camera["Protocol"] + self.camera["Username"] + ":" + self.camera["Password"]
+            self.stream += "@" + self.camera["IP"] + self.camera["Path"]
+        elif "Capture Factory" in self.camera:
+            self.stream = self.camera["Capture Factory"].__name__
+        else:
+            self.stream = self.camera["USB ID"]
+        print("Connecting to camera: %s" % self.stream)
+        if "USB ID" in self.camera:  # USB camera can not be opened again before it has been released
+            self._wait_for_release()
+        self.connection_attempts.append({"TIME": time.time(), "STREAM": self.stream, "FIRST FRAME TIME": None})
+        self._connect_start_time = time.monotonic()
+        if "Broker" in self.camera:  # Camera stream is shared with other viewers by stream broker
+            from broker_capture import BrokerCapture  # Imported when used (multiprocessing adds to startup time)
+            self.capture = BrokerCapture(self.camera)
+        elif "Capture Factory" in self.camera:  # VideoCapture stand-in, e.g. synthetic camera of benchmark
+            self.capture = self.camera["Capture Factory"](self.camera)
+        elif "USB ID" in self.camera:
+            self.capture = cv2.VideoCapture(self.stream, cv2.CAP_DSHOW)
+        else:
+            open_timeout = self.camera.get("Open Timeout", CAMERA_OPEN_TIMEOUT)
+            read_timeout = self.camera.get("Read Timeout", CAMERA_READ_TIMEOUT)
+            with _ffmpeg_options_lock:
+                if hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):  # OpenCV 4.6+
+                    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = self._ffmpeg_options()
+                    parameters = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, int(open_timeout * 1000),
+                                  cv2.CAP_PROP_READ_TIMEOUT_MSEC, int(read_timeout * 1000)]
+                    self.capture = cv2.VideoCapture(self.stream, cv2.CAP_FFMPEG, parameters)
+                else:  # Older OpenCV, timeouts are FFmpeg options (parameters need OpenCV 4.5.2+)
+                    os.environ["OPENCV_FFMPEG_CAPTURE_OPTIONS"] = self._ffmpeg_options(max(open_timeout, read_timeout))
+                    self.capture = cv2.VideoCapture(self.stream, cv2.CAP_FFMPEG)
+        return self.capture
+
+    def _ffmpeg_options(self, timeout=None):  # timeout: seconds, FFmpeg socket timeout (OpenCV before 4.6)
+        options = []
+        if self.stream.startswith("rtsp://"):
+            options.append("rtsp_transport;" + self.camera.get("Transport", RTSP_TRANSPORT))
+            if timeout is not None:
+                options.append("stimeout;%i" % (timeout * 1000000))  # microseconds (FFmpeg 4 of OpenCV before 4.6)
+        elif timeout is not None:
+            options.append("timeout;%i" % (timeout * 1000000))  # microseconds (http, tcp, ...)
+        if self.camera.get("Low Latency", RTSP_LOW_LATENCY):
+            options.extend(["fflags;nobuffer", "flags;low_delay"])
+        return "|".join(options)
+
+    def _first_frame(self):
+        first_frame_time = time.monotonic() - self._connect_start_time
+        self.connection_attempts[-1]["FIRST FRAME TIME"] = first_frame_time
+        print("Time to first camera frame: %.2f s" % first_frame_time)
+
+    def _reconnect_delay(self, reconnect_attempt):
+        delay = min(RECONNECT_DELAY_MAX, RECONNECT_DELAY_MIN * 2 ** reconnect_attempt)
+        return delay * random.uniform(1 - RECONNECT_JITTER, 1 + RECONNECT_JITTER)
+
+    def _stop(self):
+        if self.capture is not None:
+            # self.data_to_gui.put({"CONNECTED": False})
+            print("Disconnecting Camera (dropped %i stale and skipped %i unchanged video frames)" %
+                  (self.frames_to_gui.dropped_frames, self.unchanged_frames))
+            self.history.clear()  # Photo must not be taken from frames of previous connection
+            with self._release_changed:
+                release_start_time = self._release_start_time
+                if release_start_time is not None and time.monotonic() - release_start_time >= CAMERA_RELEASE_TIMEOUT:
+                    self._abandon_release_thread()  # e.g. network camera reconnects, its handle is not queued behind
+                self._releases_pending += 1
+                self._captures_to_release.put(self.capture)  # Camera thread does not wait for a hung camera
+            self.capture = None
+
+    def _start_release_thread(self):  # New release thread (and queue) when previous one is stuck in a hung release
+        captures_to_release = queue.Queue()
+        thread_target = self._release_thread
+        thread_name = __class__.__name__ + "." + thread_target.__name__
+        self.release_thread = threading.Thread(target=thread_target, name=thread_name, args=(captures_to_release,))
+        self.release_thread.setDaemon(True)  # stop thread when script exits (also when stuck in a hung release)
+        self.release_thread.start()
+        self._captures_to_release = captures_to_release
+
+    def _release_thread(self, captures_to_release):
+        while True:
+            capture = captures_to_release.get()
+            if capture is None:
+                break
+            with self._release_changed:
+                if captures_to_release is self._captures_to_release:
+                    self._release_start_time = time.monotonic()
+            try:
+                capture.release()
+            except:
+                print("ERROR: Could not disconnect from camera")
+            with self._release_changed:
+                if captures_to_release is not self._captures_to_release:
+                    break  # Thread has been abandoned during this release, its queue is served by a new thread
+                self._release_start_time = None
+                self._releases_pending -= 1
+                self._release_changed.notify_all()
+
+    def _wait_for_release(self):  # Wait (bounded) until previous capture handles have been released
+        with self._release_changed:
+            if not self._release_changed.wait_for(lambda: self._releases_pending == 0, CAMERA_RELEASE_TIMEOUT):
+                self._abandon_release_thread()
+
+    def _abandon_release_thread(self):  # Called with _release_changed held, hung release keeps its own thread
+        abandoned_captures = self._captures_to_release
+        self._start_release_thread()  # Handles queued after the hung release are released by a new thread
+        self._releases_pending = 0
+        self._release_start_time = None
+        while True:
+            try:
+                capture = abandoned_captures.get_nowait()
+            except queue.Empty:
+                break
+            self._releases_pending += 1
+            self._captures_to_release.put(capture)
+        print("ERROR: Camera was not disconnected within %.0f s (capture handle abandoned)" % CAMERA_RELEASE_TIMEOUT)
+
+    def frame_feedback(self, latency):  # Grab to display latency of live view frame (None if it was not shown)
+        adaptive_quality = self.adaptive_quality
+        if adaptive_quality is not None:
+            if latency is None:
+                adaptive_quality.add_dropped()
+            else:
+                adaptive_quality.add_frame(latency)
+
+    def _frame_interval(self):  # Camera frames per retrieved frame
+        adaptive_quality = self.adaptive_quality
+        if adaptive_quality is None or self._snapshot_requested.is_set():  # Photo is taken from next frame
+            return 1
+        return adaptive_quality.frame_interval
+
+    def _send_to_gui(self, data):
+        self.data_to_gui.put(data)
+        self._notify_gui()
+
+    def _send_frame_to_gui(self, frame, generation):
+        with self._gui_lock:
+            if generation != self._frame_generation:
+                return  # Camera status has changed since frame was grabbed
+            frame.enqueue_time = time.monotonic()
+            notify = self.frames_to_gui.put(frame)  # Gui is already notified when buffer holds unread frames
+        if notify:
+            self._notify_gui()
+
+    def _notify_gui(self):
+        notify = self.notify
+        if notify is not None:
+            notify()
+
+    def _camera_thread(self):
+        camera_running = False
+        reconnect_time = None  # Time of next automatic reconnect attempt
+        reconnect_attempt = 0
+        skipped_frames = 0  # Grabbed frames since last retrieved frame
+        sequence = 0  # Grabbed frames, gaps in sequence of live view frames are frames which were not retrieved
+        while not self.quit: # loop until the script is terminated
+            message = None
+            if not camera_running:
+                try:  # Wait for command from gui while camera is idle
+                    timeout = None if reconnect_time is None else max(0, reconnect_time - time.monotonic())
+                    message = self.data_from_gui.get(timeout=timeout)
+                except queue.Empty:  # Time to reconnect
+                    reconnect_time = None
+                    reconnect_attempt += 1
+                    text = "RECONNECTING TO CAMERA (ATTEMPT %i)" % reconnect_attempt
+                    self._send_status(CameraStatus.RECONNECTING, text, False)
+                    capture = self._start()
+                    camera_running = True
+                    camera_connecting = True
+            elif not self.data_from_gui.empty(): # if data from gui arrived
+                message = self.data_from_gui.get_nowait()
+            if message is not None:
+                command = message.command
+                if command is Command.QUIT:
+                    camera_running = False
+                    self._stop()
+                    self.quit = True
+                elif command is Command.STOP:
+                    self._send_status(CameraStatus.DISCONNECTING, "DISCONNECTING CAMERA", True)
+                    camera_running = False
+                    reconnect_time = None
+                    self._stop()
+                elif command is Command.START:
+                    self._send_status(CameraStatus.CONNECTING, "CONNECTING TO CAMERA", True)
+                    capture = self._start()
+                    camera_running = True
+                    camera_connecting = True
+                    reconnect_time = None
+                    reconnect_attempt = 0
+                elif command is Command.SETTINGS:
+                    self._settings(message.data)
+                elif command is Command.SNAPSHOT:
+                    self._snapshot_requested.set()
+                elif command is Command.BURST:
+                    self._burst_requested.set()
+                    self._snapshot_requested.set()
+                elif command is Command.RECORD:  # data: True starts and False stops recording
+                    if message.data:
+                        self._start_recording(capture if camera_running else None)
+                    else:
+                        self._stop_recording()
+            if camera_running:
+                status_ok = capture.grab()  # Blocks until next frame from camera (keeps network buffer drained)
+                grab_time = time.monotonic()
+                skipped_frames += 1
+                frame_wanted = skipped_frames >= self._frame_interval()
+                if status_ok and frame_wanted and not self._decode_ready.is_set():  # Gui has fallen behind camera
+                    self.frame_feedback(None)
+                    frame_wanted = False
+                recorder = self.recorder
+                record_frame = recorder is not None and recorder.uses_frames  # Every frame, independent of gui
+                if status_ok:
+                    sequence += 1
+                if status_ok and (frame_wanted or record_frame):  # Only retrieve frames which are used
+                    if frame_wanted:
+                        skipped_frames = 0
+                        self._decode_ready.clear()
+                    generation = self._frame_generation
+                    status_ok, image = capture.retrieve()
+                    if status_ok and record_frame:  # Recorder drops (and counts) frames when it falls behind
+                        recorder.put(image, grab_time)
+                    if status_ok and frame_wanted:
+                        self._grabbed_frames.put((generation, sequence, image, grab_time, time.monotonic()))
+                    elif frame_wanted:
+                        self._decode_ready.set()
+                if status_ok and not frame_wanted:  # Not shown (gui has fallen behind or live view quality is lowered)
+                    self.frames_to_gui.count_dropped()
+                if recorder is not None and recorder.error is not None:  # e.g. FFmpeg has ended
+                    self._stop_recording()
+                if not status_ok:
+                    if camera_connecting:
+                        status = CameraStatus.CONNECTION_FAILED
+                        text = "COULD NOT CONNECT TO CAMERA"
+                    else:
+                        status = CameraStatus.CONNECTION_LOST
+                        text = "LOST CONNECTION TO CAMERA"
+                        reconnect_attempt = 0
+                    camera_running = False
+                    self._stop()
+                    if self.camera.get("Reconnect", RECONNECT):
+                        delay = self._reconnect_delay(reconnect_attempt)
+                        reconnect_time = time.monotonic() + delay
+                        text += " - RECONNECTING IN %.0f s" % max(1, delay)
+                    self._send_status(status, text, False)
+                elif camera_connecting:
+                    self._first_frame()
+                if camera_connecting:
+                    camera_connecting = False
+        self._grabbed_frames.close()
+        self.frames_to_gui.close()
+        self.decode_thread.join()
+        self._stop_recording(wait=True)
+        self._wait_for_release()
+        self._captures_to_release.put(None)  # Release thread ends after pending releases (hung release: with script)
+        print("Camera Thread Loop Ended")
+        self.thread_ended = True
+        self._notify_gui()  # Gui closes when camera thread has ended
+
+    def _decode_thread(self):
+        motion_generation = None
+        while not self.quit:
+            self.frames_to_gui.wait_for_space()  # Wait until gui is ready for a new frame
+            self._decode_ready.set()
+            grabbed_frame = self._grabbed_frames.get(block=True)  # Wait for camera thread to retrieve newest frame
+            if grabbed_frame is None:
+                continue
+            generation, sequence, frame_image, grab_time, decode_time = grabbed_frame  # BGR frame is shown as it is
+            height, width, channel = frame_image.shape
+            self.frame_aspect_ratio = width / height
+            self.history.add(frame_image)
+            if self._snapshot_requested.is_set():
+                self._snapshot_requested.clear()
+                photo_frame = self.history.sharpest()
+                photo = PhotoMessage(frame_image if photo_frame is None else photo_frame)
+                if self._burst_requested.is_set():
+                    self._burst_requested.clear()
+                    photo.burst_frames = self.history.burst()
+                self._send_to_gui(photo)
+            motion_detector = self.motion_detector
+            if motion_detector is not None:
+                if generation != motion_generation:  # First frame after camera status change is always shown
+                    motion_generation = generation
+                    motion_detector.reset()
+                changed, motion = motion_detector.update(frame_image)
+                if motion is not None:
+                    self._send_to_gui(MotionMessage(motion, time.time()))
+                if not changed:  # Gui does not repaint a frame which looks the same
+                    self.unchanged_frames += 1
+                    continue
+            preview_width = self.preview_width
+            adaptive_quality = self.adaptive_quality
+            if adaptive_quality is not None:
+                if adaptive_quality.update():
+                    print("Live view quality level %i of %i (1 of %i camera frames, %i%% width)" %
+                          (adaptive_quality.level, len(adaptive_quality.levels) - 1, adaptive_quality.frame_interval,
+                           adaptive_quality.preview_scale * 100))
+                if preview_width:
+                    preview_width = max(1, round(preview_width * adaptive_quality.preview_scale))
+            if preview_width and width > preview_width:  # Scale down here instead of in gui thread
+                frame_image = self._preview_frame(frame_image, preview_width)
+            video_frame = VideoFrame(frame_image, (width, height), sequence, grab_time, decode_time, time.monotonic())
+            self._send_frame_to_gui(video_frame, generation)
+
+    def _preview_frame(self, frame, preview_width):  # Frame scaled down into a reused live view buffer
+        height, width, channel = frame.shape
+        geometry_key = width, height, preview_width
+        if self._preview_geometry is None or self._preview_geometry[0] != geometry_key:  # Once per resolution
+            self._preview_geometry = geometry_key, (preview_width, max(1, round(height * preview_width / width)))
+            self._preview_buffers.clear()
+        preview_size = self._preview_geometry[1]
+        preview_shape = preview_size[1], preview_size[0], channel
+        preview_buffer = self.preview_buffer  # e.g. shared memory slot of process backend
+        preview_frame = None if preview_buffer is None else preview_buffer(preview_shape)
+        if preview_frame is None:
+            try:
+                preview_frame = self._preview_buffers.pop()
+            except IndexError:
+                preview_frame = np.empty(preview_shape, frame.dtype)
+        if preview_frame.shape != preview_shape:  # Released after resolution change
+            preview_frame = np.empty(preview_shape, frame.dtype)
+        return cv2.resize(frame, preview_size, dst=preview_frame, interpolation=cv2.INTER_AREA)
+
+    def _release_frame(self, frame, dropped):  # Frame is no longer shown by gui, scaled buffer can be reused
+        if isinstance(frame, VideoFrame):
+            if frame.display_time is not None:  # Frames the gui was not ready for are counted by camera thread
+                self.frame_feedback(frame.display_time - frame.grab_time)
+            elif dropped:  # Gui buffer has dropped frame, frames taken but not painted (photo shown) are ignored
+                self.frame_feedback(None)
+            if frame.image.shape[1] != frame.resolution[0]:
+                self._preview_buffers.append(frame.image)
+
+    def _start_recording(self, capture):
+        if self.recorder is not None:
+            return
+        import video_recorder  # Imported when used (startup time)
+        settings = self._recording_settings
+        file = settings.get("RECORDING FILE") or video_recorder.RECORDING_FILE
+        segment_time = settings.get("RECORDING SEGMENT TIME") or video_recorder.RECORDING_SEGMENT_TIME
+        stream = getattr(self, "stream", None)
+        remux = settings.get("RECORDING REMUX", video_recorder.RECORDING_REMUX) and "Broker" not in self.camera
+        if remux and video_recorder.StreamRecorder.available(stream):
+            stream_options = {"rtsp_transport": self.camera.get("Transport", RTSP_TRANSPORT)}
+            self.recorder = video_recorder.StreamRecorder(stream, file, segment_time, stream_options)
+            print("Recording camera stream (no re-encoding): %s" % file)
+            self._send_to_gui(RecordingMessage(True, file))
+            return
+        fps = video_recorder.RECORDING_FPS
+        if capture is not None and 0 < capture.get(cv2.CAP_PROP_FPS) <= 240:
+            fps = capture.get(cv2.CAP_PROP_FPS)
+        segment_started = lambda segment_file: self._send_to_gui(RecordingMessage(True, segment_file))
+        self.recorder = video_recorder.VideoRecorder(file, segment_time, fps, segment_started=segment_started)
+
+    def _stop_recording(self, wait=False):  # wait: segment file is finished (camera thread ends, no live view)
+        recorder = self.recorder
+        if recorder is None:
+            return
+        self.recorder = None
+        error = recorder.error
+        recorder.close()  # Live view keeps running while recorder writes its waiting frames
+        if wait:
+            recorder.wait(CAMERA_READ_TIMEOUT)
+        if error is not None:
+            print("ERROR: Recording failed: %s" % error)
+        print("Recording ended (dropped %i video frames)" % recorder.dropped_frames)
+        self._send_to_gui(RecordingMessage(False, dropped_frames=recorder.dropped_frames, error=error))
+
+    def _send_status(self, status, text, busy):  # Gui shows status text (see status_frame) instead of live view
+        with self._gui_lock:
+            self._frame_generation += 1
+            self.frames_to_gui.clear()  # Stale video frames must not be shown after the status
+        self._send_to_gui(StatusMessage(status, text, self.frame_aspect_ratio, busy))
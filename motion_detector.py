@@ -0,0 +1,48 @@
+import time
+
+import numpy as np  # pip install numpy
+import cv2  # pip install OpenCV-python
+
+
+MOTION_ANALYSIS_WIDTH = 64  # Width of grayscale copy used for change detection (noise is averaged out)
+MOTION_PIXEL_THRESHOLD = 12  # Gray level difference of a changed pixel (0 - 255)
+MOTION_CHANGE_THRESHOLD = 0.002  # Fraction of changed pixels, less is an unchanged frame (no repaint)
+MOTION_EVENT_THRESHOLD = 0.02  # Fraction of changed pixels which is reported as motion
+MOTION_EVENT_INTERVAL = 2.0  # seconds, minimum time between motion events
+MOTION_REFRESH_INTERVAL = 1.0  # seconds, unchanged frames are still shown this often (gui sees a live camera)
+
+
+class MotionDetector:  # Change between frames from downsampled grayscale copies, used by camera decode thread
+
+    def __init__(self, event_threshold=MOTION_EVENT_THRESHOLD, change_threshold=MOTION_CHANGE_THRESHOLD):
+        self.event_threshold = event_threshold
+        self.change_threshold = change_threshold
+        self._reference = None  # Grayscale copy of last changed frame
+        self._next_refresh_time = 0
+        self._next_event_time = 0
+
+    def reset(self):  # Next frame is a changed frame (e.g. after camera status change)
+        self._reference = None
+
+    def update(self, frame):  # Returns (frame must be shown, fraction of changed pixels if motion else None)
+        height, width, channel = frame.shape
+        analysis_size = (MOTION_ANALYSIS_WIDTH, max(1, round(height * MOTION_ANALYSIS_WIDTH / width)))
+        gray_frame = cv2.cvtColor(cv2.resize(frame, analysis_size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        now = time.monotonic()
+        if self._reference is None or self._reference.shape != gray_frame.shape:  # First frame is not motion
+            self._reference = gray_frame
+            self._next_refresh_time = now + MOTION_REFRESH_INTERVAL
+            return True, None
+        difference = cv2.absdiff(gray_frame, self._reference)
+        change = np.count_nonzero(difference > MOTION_PIXEL_THRESHOLD) / difference.size
+        motion = None
+        if change >= self.event_threshold and now >= self._next_event_time:
+            self._next_event_time = now + MOTION_EVENT_INTERVAL
+            motion = change
+        changed = change >= self.change_threshold
+        if changed:
+            self._reference = gray_frame
+        if changed or now >= self._next_refresh_time:
+            self._next_refresh_time = now + MOTION_REFRESH_INTERVAL
+            return True, motion
+        return False, motion
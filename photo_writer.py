@@ -0,0 +1,64 @@
+import os
+import queue
+import threading
+
+import cv2  # pip install OpenCV-python
+
+from atomic_file import write_file_atomic
+
+
+# Encoder parameters per photo file type (file type is given by photo file extension)
+PHOTO_ENCODER_SETTINGS = \
+    {
+        ".png": [cv2.IMWRITE_PNG_COMPRESSION, 3],  # 0 (fast, large file) - 9 (slow, small file)
+        ".jpg": [cv2.IMWRITE_JPEG_QUALITY, 95],  # 0 - 100
+        ".jpeg": [cv2.IMWRITE_JPEG_QUALITY, 95],
+        ".webp": [cv2.IMWRITE_WEBP_QUALITY, 101],  # 1 - 100, above 100 is lossless
+    }
+
+
+class PhotoWriter:  # Encodes and saves photos (BGR numpy frames) in a background thread
+
+    def __init__(self, encoder_settings=None):
+        self.encoder_settings = dict(PHOTO_ENCODER_SETTINGS)
+        if encoder_settings is not None:
+            self.encoder_settings.update(encoder_settings)
+        self._photos = queue.Queue()
+        thread_target = self._writer_thread
+        thread_name = __class__.__name__ + "." + thread_target.__name__
+        self.writer_thread = threading.Thread(target=thread_target, name=thread_name)
+        self.writer_thread.setDaemon(True)  # stop thread when script exits
+        self.writer_thread.start()
+
+    def save(self, frame, file, done=None):  # done(file, error) is called from writer thread, error is None if saved
+        self._photos.put((frame, file, done))
+
+    def write(self, frame, file):  # Encode and write photo in calling thread (see write_photo)
+        write_photo(frame, file, self.encoder_settings)
+
+    def _writer_thread(self):
+        while True:
+            frame, file, done = self._photos.get()
+            error = None
+            try:
+                self.write(frame, file)
+                print("Photo saved to file: %s" % file)
+            except (OSError, ValueError) as exception:
+                error = str(exception)
+                print("ERROR: Could not save photo to file: %s (%s)" % (file, error))
+            if done is not None:
+                done(file, error)
+
+
+def write_photo(frame, file, encoder_settings=None):  # Encode and write photo, raises OSError or ValueError
+    extension = os.path.splitext(file)[1].lower()
+    parameters = PHOTO_ENCODER_SETTINGS.get(extension, [])
+    if encoder_settings is not None:
+        parameters = encoder_settings.get(extension, parameters)
+    try:
+        encoded_ok, encoded_photo = cv2.imencode(extension, frame, parameters)
+    except cv2.error as exception:
+        raise ValueError("Could not encode photo as '%s': %s" % (extension, exception))
+    if not encoded_ok:
+        raise ValueError("Could not encode photo as '%s'" % extension)
+    write_file_atomic(file, encoded_photo, sync=True)  # A partial photo file is never left behind
@@ -0,0 +1,137 @@
+import json
+import time
+import threading
+import collections
+
+import numpy as np  # pip install numpy
+
+from atomic_file import write_file_atomic
+
+
+PIPELINE_STAGES = ("grab", "decode", "convert", "enqueue", "display")  # VideoFrame.<stage>_time in order
+STATS_WINDOW = 300  # Number of latest frames used for frame rate and latency statistics
+
+
+class PipelineStats:  # Thread safe rolling frame rate, per stage latency and counters of the live view pipeline
+
+    def __init__(self, name="camera", window=STATS_WINDOW):
+        self.name = name
+        self.window = window
+        self._lock = threading.Lock()
+        self.startup = {}  # Startup times in seconds, e.g. {"window": ..., "first_frame": ...}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stage_latencies = {stage: collections.deque(maxlen=self.window) for stage in PIPELINE_STAGES[1:]}
+            self._total_latencies = collections.deque(maxlen=self.window)  # Grab to last stamped stage
+            self._frame_times = collections.deque(maxlen=self.window)
+            self.frames = 0
+            self.dropped_frames = 0
+            self.queue_depth = 0
+
+    def merge(self, stats):  # Add latencies and counters of other statistics (e.g. all cameras of a grid)
+        with stats._lock:
+            stage_latencies = {stage: list(latencies) for stage, latencies in stats._stage_latencies.items()}
+            total_latencies = list(stats._total_latencies)
+            frames, dropped_frames, queue_depth = stats.frames, stats.dropped_frames, stats.queue_depth
+        with self._lock:
+            for stage, latencies in stage_latencies.items():
+                self._stage_latencies[stage].extend(latencies)
+            self._total_latencies.extend(total_latencies)
+            self.frames += frames
+            self.dropped_frames += dropped_frames
+            self.queue_depth += queue_depth
+
+    def add_frame(self, video_frame):  # Frame with stage times (None for stages which frame has not passed)
+        stage_times = (video_frame.decode_time, video_frame.convert_time, video_frame.enqueue_time,
+                       video_frame.display_time)  # PIPELINE_STAGES[1:]
+        grab_time = video_frame.grab_time
+        with self._lock:
+            self.frames += 1
+            previous_time = grab_time
+            for stage, stage_time in zip(PIPELINE_STAGES[1:], stage_times):
+                if stage_time is None:
+                    continue
+                if previous_time is not None:
+                    self._stage_latencies[stage].append(stage_time - previous_time)
+                previous_time = stage_time
+            if grab_time is not None and previous_time is not None:
+                self._total_latencies.append(previous_time - grab_time)
+            self._frame_times.append(time.monotonic())
+
+    def set_counters(self, dropped_frames=None, queue_depth=None):
+        with self._lock:
+            if dropped_frames is not None:
+                self.dropped_frames = dropped_frames
+            if queue_depth is not None:
+                self.queue_depth = queue_depth
+
+    def set_startup_time(self, stage, seconds):  # Kept when statistics are reset
+        with self._lock:
+            self.startup[stage] = seconds
+
+    def summary(self):  # Frame rate, latency percentiles (milliseconds) and counters
+        with self._lock:
+            fps = 0.0
+            if len(self._frame_times) > 1:
+                duration = self._frame_times[-1] - self._frame_times[0]
+                if duration > 0:
+                    fps = (len(self._frame_times) - 1) / duration
+            latencies = {stage: _percentiles(values) for stage, values in self._stage_latencies.items()}
+            latencies["total"] = _percentiles(self._total_latencies)
+            return {"name": self.name, "time": time.time(), "fps": fps, "frames": self.frames,
+                    "dropped_frames": self.dropped_frames, "queue_depth": self.queue_depth, "latency_ms": latencies,
+                    "startup_s": dict(self.startup)}
+
+    def status_text(self):
+        summary = self.summary()
+        total = summary["latency_ms"]["total"]
+        text = "%.1f fps" % summary["fps"]
+        if total is not None:
+            text += " | latency p50 %.0f ms, p99 %.0f ms" % (total["p50"], total["p99"])
+            stages = ["%s %.0f/%.0f" % (stage, percentiles["p50"], percentiles["p99"])
+                      for stage, percentiles in summary["latency_ms"].items()
+                      if stage != "total" and percentiles is not None]
+            text += " (p50/p99 ms: %s)" % ", ".join(stages)  # Stage latency from previous stage
+        text += " | dropped %i | queue %i" % (summary["dropped_frames"], summary["queue_depth"])
+        return text
+
+    def export(self, file):  # Prometheus text file (*.prom, overwritten) or JSON lines file (appended)
+        summary = self.summary()
+        if file.endswith(".prom"):
+            write_file_atomic(file, _prometheus_text(summary).encode())  # Readers (node exporter) never see a partial file
+        else:
+            with open(file, "a") as stats_file:
+                stats_file.write(json.dumps(summary) + "\n")
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    p50, p99 = np.percentile(np.fromiter(values, float, len(values)), [50, 99]) * 1000
+    return {"p50": p50, "p99": p99}
+
+
+def _prometheus_text(summary):
+    label = 'camera="%s"' % summary["name"].replace("\\", "\\\\").replace('"', '\\"')
+    lines = [
+        "# TYPE camera_live_view_fps gauge",
+        "camera_live_view_fps{%s} %f" % (label, summary["fps"]),
+        "# TYPE camera_live_view_frames_total counter",
+        "camera_live_view_frames_total{%s} %i" % (label, summary["frames"]),
+        "# TYPE camera_live_view_dropped_frames_total counter",
+        "camera_live_view_dropped_frames_total{%s} %i" % (label, summary["dropped_frames"]),
+        "# TYPE camera_live_view_queue_depth gauge",
+        "camera_live_view_queue_depth{%s} %i" % (label, summary["queue_depth"]),
+        "# TYPE camera_startup_seconds gauge",
+    ]
+    for stage, seconds in summary["startup_s"].items():
+        lines.append('camera_startup_seconds{%s,stage="%s"} %f' % (label, stage, seconds))
+    lines.append("# TYPE camera_live_view_latency_ms gauge")
+    for stage, percentiles in summary["latency_ms"].items():
+        if percentiles is None:
+            continue
+        for quantile, value in (("0.5", percentiles["p50"]), ("0.99", percentiles["p99"])):
+            lines.append('camera_live_view_latency_ms{%s,stage="%s",quantile="%s"} %f' % (label, stage, quantile, value))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,240 @@
+import os
+import sys
+import hmac
+import json
+import time
+import queue
+import socket
+import secrets
+import argparse
+import threading
+from multiprocessing import shared_memory
+
+# Local imports (no PyQt, broker runs on servers without display)
+script_path_file = __file__
+script_path = os.path.dirname(script_path_file)
+sys.path.append(script_path)
+from live_camera import FrameBuffer
+from live_camera import LiveCamera
+from camera_messages import Command
+from camera_messages import CommandMessage
+from camera_messages import StatusMessage
+from broker_capture import BROKER_ADDRESS
+from broker_capture import BROKER_READ_TIMEOUT
+from broker_capture import BROKER_FRAME_SLOTS
+from broker_capture import broker_authkey
+from broker_capture import challenge_response
+from broker_capture import receive_message
+from broker_capture import send_message
+from broker_capture import ring_arrays
+
+
+BROKER_IDLE_TIMEOUT = 10  # seconds, camera connection is kept this long after the last subscriber has left
+BROKER_LOCAL_ONLY_KEYS = ("Capture Factory",)  # Camera configuration keys which subscribers can not send
+
+
+class StreamBroker:  # Opens every unique camera configuration once and shares its frames with all subscribers
+
+    def __init__(self, address=BROKER_ADDRESS, authkey=None, idle_timeout=BROKER_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._authkey = broker_authkey() if authkey is None else authkey  # Subscribers of same user share key file
+        self._listener = socket.create_server(address)
+        self.address = self._listener.getsockname()[:2]
+        self._streams = {}  # {configuration key: _BrokerStream}
+        self._lock = threading.Lock()
+
+    def serve_forever(self):
+        print("Stream broker listening on: %s:%i" % self.address)
+        while True:
+            try:
+                client, _ = self._listener.accept()
+            except OSError as exception:
+                print("ERROR: Stream broker client could not connect: %s" % exception)
+                continue
+            thread_target = self._client_thread
+            thread_name = __class__.__name__ + "." + thread_target.__name__
+            thread = threading.Thread(target=thread_target, name=thread_name, args=(client,))
+            thread.setDaemon(True)  # stop thread when script exits
+            thread.start()
+
+    def _client_thread(self, client):
+        stream = None
+        try:
+            client.settimeout(BROKER_READ_TIMEOUT)  # Until subscriber is authenticated
+            challenge = secrets.token_bytes(32)
+            send_message(client, {"challenge": challenge.hex()})
+            message = receive_message(client)
+            response = str(message.get("response")).encode()
+            if not hmac.compare_digest(response, challenge_response(self._authkey, b"viewer", challenge).encode()):
+                print("ERROR: Stream broker client could not connect: authentication failed")
+                send_message(client, {"reply": "ERROR", "error": "Authentication failed"})
+                return
+            viewer_challenge = bytes.fromhex(str(message.get("challenge", "")))  # Viewer authenticates broker
+            send_message(client, {"response": challenge_response(self._authkey, b"broker", viewer_challenge)})
+            client.settimeout(None)
+            request = receive_message(client)
+            error = self._subscribe_error(request)
+            if error is not None:
+                send_message(client, {"reply": "ERROR", "error": error})
+                return
+            stream = self._subscribe(request["configuration"])
+            send_message(client, {"reply": "OK"})
+            frame_index = 0
+            while receive_message(client).get("request") == "GRAB":
+                reply = stream.next_frame(frame_index, BROKER_READ_TIMEOUT)
+                if reply["reply"] == "FRAME":
+                    frame_index = reply["index"]
+                send_message(client, reply)
+        except (OSError, EOFError, ValueError):
+            pass  # Subscriber has disconnected (or has sent an invalid message)
+        finally:
+            client.close()
+            if stream is not None:
+                self._unsubscribe(stream)
+
+    @staticmethod
+    def _subscribe_error(request):  # None or error text of SUBSCRIBE request
+        if request.get("request") != "SUBSCRIBE":
+            return "Unknown request: %s" % request.get("request")
+        configuration = request.get("configuration")
+        if not isinstance(configuration, dict):
+            return "Camera configuration is not a JSON object"
+        for key in BROKER_LOCAL_ONLY_KEYS:
+            if key in configuration:
+                return "Camera configuration key is not allowed: %s" % key
+        return None
+
+    def _subscribe(self, configuration):
+        key = json.dumps(configuration, sort_keys=True)
+        with self._lock:
+            stream = self._streams.get(key)
+            if stream is None:
+                print("Stream broker opens camera: %s" % _log_text(configuration))
+                stream = _BrokerStream(configuration)
+                self._streams[key] = stream
+            stream.subscribers += 1
+            stream.idle_time = None
+        return stream
+
+    def _unsubscribe(self, stream):
+        with self._lock:
+            stream.subscribers -= 1
+            if stream.subscribers == 0:
+                stream.idle_time = time.monotonic()
+                timer = threading.Timer(self.idle_timeout, self._close_idle_streams)
+                timer.setDaemon(True)  # stop timer when script exits
+                timer.start()
+
+    def _close_idle_streams(self):
+        with self._lock:
+            now = time.monotonic()
+            for key, stream in list(self._streams.items()):
+                if stream.idle_time is not None and now - stream.idle_time >= self.idle_timeout:
+                    print("Stream broker closes idle camera: %s" % _log_text(json.loads(key)))
+                    del self._streams[key]
+                    stream.close()
+
+
+class _BrokerStream:  # One camera connection (LiveCamera) writing its frames into a shared memory ring
+
+    def __init__(self, configuration):
+        self.subscribers = 0
+        self.idle_time = None  # Time when the last subscriber has left
+        self._shared_ring = None
+        self._slot_indexes = None  # Frame index of every slot (-1 while slot is written)
+        self._slot_frames = None
+        self._frame_index = 0
+        self._error = None  # Camera status text when camera connection has failed
+        self._changed = threading.Condition()
+        self.data_to_gui = queue.Queue()
+        self.data_from_gui = queue.Queue()
+        self.frames_to_gui = FrameBuffer(1)
+        self.camera = LiveCamera(self.data_to_gui, self.data_from_gui, self.frames_to_gui)
+        self._data_arrived = threading.Event()
+        self.camera.notify = self._data_arrived.set
+        settings = {"NAME": "broker", "CONFIG": configuration, "ADAPTIVE QUALITY": False}  # Every full resolution frame
+        self.data_from_gui.put(CommandMessage(Command.SETTINGS, settings))
+        self.data_from_gui.put(CommandMessage(Command.START))
+        thread_target = self._frame_thread
+        thread_name = __class__.__name__ + "." + thread_target.__name__
+        self.frame_thread = threading.Thread(target=thread_target, name=thread_name)
+        self.frame_thread.setDaemon(True)  # stop thread when script exits
+        self.frame_thread.start()
+
+    def next_frame(self, frame_index, timeout):  # FRAME reply (ring name, shape, slot, frame index) or ERROR reply
+        with self._changed:
+            self._changed.wait_for(lambda: self._frame_index > frame_index or self._error is not None, timeout)
+            if self._frame_index > frame_index and self._shared_ring is not None:
+                slot = self._frame_index % BROKER_FRAME_SLOTS
+                return {"reply": "FRAME", "ring": self._shared_ring.name, "shape": self._slot_frames.shape[1:],
+                        "slot": slot, "index": self._frame_index}
+            if self._error is not None:
+                return {"reply": "ERROR", "error": self._error}
+            return {"reply": "ERROR", "error": "No frame from camera within %.0f s" % timeout}
+
+    def close(self):
+        self.camera.notify = None
+        self.data_from_gui.put(CommandMessage(Command.QUIT))
+        self._data_arrived.set()
+
+    def _frame_thread(self):
+        while not self.camera.thread_has_ended():
+            self._data_arrived.wait(timeout=1)
+            self._data_arrived.clear()
+            while not self.data_to_gui.empty():
+                message = self.data_to_gui.get_nowait()
+                if isinstance(message, StatusMessage):
+                    with self._changed:  # Subscribers waiting for a frame see the camera status instead
+                        self._error = message.text if message.status.failed else None
+                        self._changed.notify_all()
+            video_frame = self.frames_to_gui.get()
+            if video_frame is not None:
+                self._write_frame(video_frame.image)
+        with self._changed:
+            self._error = "CAMERA CLOSED BY STREAM BROKER"
+            self._changed.notify_all()
+            if self._shared_ring is not None:
+                self._slot_indexes = None
+                self._slot_frames = None
+                self._shared_ring.close()
+                self._shared_ring.unlink()  # Subscribers keep their own mapping until they let go of it
+
+    def _write_frame(self, frame):
+        if self._slot_frames is None or self._slot_frames.shape[1:] != frame.shape:
+            with self._changed:
+                if self._shared_ring is not None:
+                    self._slot_indexes = None
+                    self._slot_frames = None
+                    self._shared_ring.close()
+                    self._shared_ring.unlink()
+                size = BROKER_FRAME_SLOTS * (8 + frame.nbytes)  # Frame index per slot and frame slots
+                self._shared_ring = shared_memory.SharedMemory(create=True, size=size)
+                self._slot_indexes, self._slot_frames = ring_arrays(self._shared_ring, frame.shape)
+                self._slot_indexes[:] = -1
+        slot = (self._frame_index + 1) % BROKER_FRAME_SLOTS
+        self._slot_indexes[slot] = -1  # Subscriber copying from this slot sees that the frame has been overwritten
+        self._slot_frames[slot] = frame
+        with self._changed:
+            self._frame_index += 1
+            self._slot_indexes[slot] = self._frame_index
+            self._error = None
+            self._changed.notify_all()
+
+
+def _log_text(configuration):  # Camera configuration without password
+    return json.dumps({key: "***" if key == "Password" else value for key, value in configuration.items()},
+                      sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Share camera streams between several viewers on this computer")
+    parser.add_argument("--host", default=BROKER_ADDRESS[0])
+    parser.add_argument("--port", type=int, default=BROKER_ADDRESS[1])
+    parser.add_argument("--idle-timeout", type=float, default=BROKER_IDLE_TIMEOUT,
+                        help="seconds camera is kept open without subscribers")
+    args = parser.parse_args()
+    StreamBroker((args.host, args.port), idle_timeout=args.idle_timeout).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
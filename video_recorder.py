@@ -0,0 +1,152 @@
+import time
+import queue
+import shutil
+import threading
+import subprocess
+
+import cv2  # pip install OpenCV-python
+
+
+RECORDING_FILE = "recording_%Y%m%d_%H%M%S.mp4"  # Segment file name (time.strftime format of segment start time)
+RECORDING_SEGMENT_TIME = 60  # seconds, recording rolls over to a new segment file
+RECORDING_BUFFER_DEPTH = 30  # Frames waiting for writer, frames are dropped (and counted) when writer falls behind
+RECORDING_FPS = 25  # Frame rate of segment files if camera does not report its frame rate
+RECORDING_FOURCC = "mp4v"  # Codec of frames written by cv2.VideoWriter
+RECORDING_REMUX = False  # Raw RTSP stream is copied by FFmpeg (no re-encoding), opens a second camera session
+FFMPEG_EXECUTABLE = "ffmpeg"
+
+
+class VideoRecorder:  # Writes BGR frames to time segmented video files in a background thread
+
+    uses_frames = True  # Camera thread puts every grabbed frame (independent of live view frame skipping)
+
+    def __init__(self, file=RECORDING_FILE, segment_time=RECORDING_SEGMENT_TIME, fps=RECORDING_FPS,
+                 fourcc=RECORDING_FOURCC, depth=RECORDING_BUFFER_DEPTH, segment_started=None):
+        self.file = file
+        self.segment_time = segment_time
+        self.fps = fps
+        self.fourcc = fourcc
+        self.segment_started = segment_started  # Called (from writer thread) with file name of every new segment
+        self.written_frames = 0
+        self.dropped_frames = 0
+        self.error = None  # Set (from writer thread) when a segment file can not be written
+        self._frames = queue.Queue(maxsize=max(1, int(depth)))  # Capture never waits for writer
+        self._closing = threading.Event()  # Writer ends when waiting frames are written
+        thread_target = self._writer_thread
+        thread_name = __class__.__name__ + "." + thread_target.__name__
+        self.writer_thread = threading.Thread(target=thread_target, name=thread_name)
+        self.writer_thread.setDaemon(True)  # stop thread when script exits
+        self.writer_thread.start()
+
+    def put(self, frame, frame_time=None):  # frame_time (time.monotonic) places frame in time of segment file
+        try:
+            self._frames.put_nowait((frame, time.monotonic() if frame_time is None else frame_time))
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def close(self):  # Waiting frames are written and segment file is closed by writer thread, caller does not wait
+        self._closing.set()
+        try:
+            self._frames.put_nowait(None)  # Wakes up writer waiting for a frame
+        except queue.Full:
+            pass  # Writer sees closing when queue is empty
+
+    def wait(self, timeout=None):  # Until segment file is closed (e.g. before script exits)
+        self.writer_thread.join(timeout)
+
+    def _writer_thread(self):
+        try:
+            self._write_segments()
+        except Exception as exception:  # Camera thread stops recording when it sees the error
+            self.error = "Video writer has failed: %s" % exception
+            print("ERROR: %s" % self.error)
+
+    def _write_segments(self):
+        writer = None
+        segment_size = None
+        segment_start_time = None
+        segment_frames = 0
+        failed_file = None
+        while not (self._closing.is_set() and self._frames.empty()):
+            recorded_frame = self._frames.get()
+            if recorded_frame is None:
+                break  # Recorder is closed and all frames are written
+            frame, frame_time = recorded_frame
+            height, width, channel = frame.shape
+            if writer is not None and (frame_time - segment_start_time >= self.segment_time or
+                                       (width, height) != segment_size):
+                writer.release()
+                writer = None
+            if writer is None:
+                file = time.strftime(self.file)
+                segment_size = width, height
+                writer = cv2.VideoWriter(file, cv2.VideoWriter_fourcc(*self.fourcc), self.fps, segment_size)
+                if not writer.isOpened():
+                    if file != failed_file:  # Error is not repeated for every frame
+                        failed_file = file
+                        self.error = "Could not write video file: %s" % file
+                        print("ERROR: %s" % self.error)
+                    writer = None
+                    continue
+                segment_start_time = frame_time
+                segment_frames = 0
+                if self.segment_started is not None:
+                    self.segment_started(file)
+            # Frames are repeated when camera (or live view) is slower than the frame rate of segment file
+            frame_index = max(segment_frames, round((frame_time - segment_start_time) * self.fps))
+            for _ in range(frame_index - segment_frames + 1):
+                writer.write(frame)
+            segment_frames = frame_index + 1
+            self.written_frames += 1
+        if writer is not None:
+            writer.release()
+
+
+class StreamRecorder:  # Copies the camera stream into time segmented video files with FFmpeg (no re-encoding)
+
+    uses_frames = False  # FFmpeg reads the camera stream itself
+
+    def __init__(self, stream, file=RECORDING_FILE, segment_time=RECORDING_SEGMENT_TIME, stream_options=None):
+        self.file = file
+        self.dropped_frames = 0  # FFmpeg reads the stream itself, live view frames are not used
+        command = [FFMPEG_EXECUTABLE, "-hide_banner", "-loglevel", "error", "-nostdin"]
+        # Stream URL (with camera password) is read from stdin as concat list, it is not shown in process list
+        command += ["-f", "concat", "-safe", "0", "-protocol_whitelist", "pipe,rtsp,rtp,udp,tcp,tls", "-i", "pipe:0",
+                    "-map", "0:v", "-c", "copy", "-f", "segment", "-segment_time", str(segment_time),
+                    "-reset_timestamps", "1", "-strftime", "1", file]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        concat_list = "ffconcat version 1.0\nfile '%s'\n" % stream.replace("'", "'\\''")
+        for option, value in (stream_options or {}).items():  # e.g. {"rtsp_transport": "tcp"} (FFmpeg 5+)
+            concat_list += "option %s %s\n" % (option, value)
+        try:
+            self.process.stdin.write(concat_list.encode())
+            self.process.stdin.close()
+        except OSError:  # FFmpeg has already ended (reported by error)
+            pass
+
+    @staticmethod
+    def available(stream):  # FFmpeg can only remux network streams
+        return isinstance(stream, str) and stream.startswith("rtsp://") and shutil.which(FFMPEG_EXECUTABLE) is not None
+
+    def put(self, frame, frame_time=None):
+        pass
+
+    @property
+    def error(self):  # FFmpeg has ended while recording (e.g. camera stream could not be opened)
+        if self.process.poll() is None:
+            return None
+        return "FFmpeg exited with code %i" % self.process.returncode
+
+    def close(self):  # FFmpeg finishes the segment file, caller does not wait
+        if self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, timeout=None):  # Until FFmpeg has ended (killed after timeout)
+        if self.process.poll() is None:
+            try:
+                self.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        if self.process.returncode not in (0, 255, -15):  # 255 and -15 (SIGTERM) are normal end of recording
+            print("ERROR: Stream recording ended with FFmpeg exit code %i" % self.process.returncode)